@@ -1,9 +1,155 @@
-from django.contrib import admin
+import hashlib
 
-from .models import Group, Post
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.forms.models import BaseModelFormSet
 
+from . import bulk
+from .models import Comment, Group, Post, PostQuerySet
+from .utils import CountingPaginator
 
-class PostAdmin(admin.ModelAdmin):
+
+class SharedLabelsSelect(AutocompleteSelect):
+    """Автодополнение, которое подписывает выбранное значение без N+1.
+
+    Обычный виджет ищет подпись выбранного объекта отдельным запросом
+    в каждой строке списка. Копии виджета в формах одного запроса
+    делят словарь labels: в списке его заполняет SharedLabelsFormSet
+    из уже загруженных объектов, а чего там нет, ищется одним
+    запросом и один раз.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.labels = {}
+
+    def optgroups(self, name, value, attr=None):
+        field = self.choices.field
+        selected = [
+            str(item) for item in value
+            if str(item) not in field.empty_values
+        ]
+        missing = [pk for pk in selected if pk not in self.labels]
+        if missing:
+            for obj in self.choices.queryset.using(self.db).filter(
+                pk__in=missing
+            ):
+                self.labels[str(obj.pk)] = field.label_from_instance(obj)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for pk in selected:
+            if pk in self.labels:
+                options.append(self.create_option(
+                    name, pk, self.labels[pk], True, len(options)
+                ))
+        return [(None, options, 0)]
+
+
+class SharedLabelsFormSet(BaseModelFormSet):
+    """Формсет list_editable, который сразу подписывает автодополнение.
+
+    Связанные объекты строк уже загружены через list_select_related,
+    поэтому их подписи кладутся в общий словарь SharedLabelsSelect,
+    и виджету не нужно искать их отдельным запросом.
+    """
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        instance = form.instance
+        for name, field in form.fields.items():
+            # админка оборачивает виджет ссылками «добавить/изменить»
+            widget = getattr(field.widget, 'widget', field.widget)
+            if not isinstance(widget, SharedLabelsSelect):
+                continue
+            if not instance._meta.get_field(name).is_cached(instance):
+                continue
+            obj = getattr(instance, name)
+            if obj is not None:
+                widget.labels.setdefault(
+                    str(field.prepare_value(obj)),
+                    field.label_from_instance(obj),
+                )
+        return form
+
+
+class DateHierarchyQuerySet(PostQuerySet):
+    """Списки лет, месяцев и дней для date_hierarchy берутся из кэша.
+
+    Для них нужен DISTINCT по всей выборке; на миллионах постов это
+    секунды, поэтому результат живёт PAGINATOR_COUNT_TIMEOUT секунд,
+    как и количество строк в CountingPaginator.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        key = 'admin:dates:' + hashlib.md5(
+            f'{self.query}|{field_name}|{kind}|{order}'.encode()
+        ).hexdigest()
+        dates = cache.get(key)
+        if dates is None:
+            dates = list(super().dates(field_name, kind, order))
+            cache.set(key, dates, settings.PAGINATOR_COUNT_TIMEOUT)
+        return dates
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Основа админок больших таблиц.
+
+    Количество строк — из CountingPaginator, подписи автодополнения —
+    без запроса на строку, а вместо стандартного удаления, которое
+    собирает каскад в Python, — пакетные действия из posts.bulk.
+    """
+    paginator = CountingPaginator
+    show_full_result_count = False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', SharedLabelsSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using'),
+            ))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_formset(self, request, **kwargs):
+        kwargs.setdefault('formset', SharedLabelsFormSet)
+        return super().get_changelist_formset(request, **kwargs)
+
+    def apply_bulk(self, request, kind, queryset, label, **params):
+        rows, queued = bulk.apply(kind, queryset, **params)
+        if queued:
+            self.message_user(
+                request,
+                f'{label}: {rows} — поставлено в очередь задачами '
+                f'({queued}), выполнит manage.py run_jobs.',
+            )
+        else:
+            self.message_user(request, f'{label}: {rows}.')
+
+
+class PostActionForm(ActionForm):
+    # поле ввода, а не <select> со всеми группами
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        required=False,
+        to_field_name='slug',
+        label='Группа',
+        widget=forms.TextInput(
+            attrs={'placeholder': 'slug группы, пусто — без группы'}
+        ),
+    )
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,10 +158,67 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    # фильтры по году и месяцу идут по индексу (-pub_date, -id)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
+    action_form = PostActionForm
+    actions = ('move_to_group', 'delete_posts')
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateHierarchyQuerySet(
+            model=queryset.model, query=queryset.query.chain(),
+            using=queryset.db,
+        )
+
+    def move_to_group(self, request, queryset):
+        try:
+            group = PostActionForm.base_fields['group'].clean(
+                request.POST.get('group')
+            )
+        except ValidationError:
+            self.message_user(
+                request, 'Такой группы нет.', level=messages.ERROR
+            )
+            return
+        self.apply_bulk(
+            request, bulk.MOVE_POSTS, queryset, 'Перенесено постов',
+            group_id=group and group.id,
+        )
+    move_to_group.short_description = 'Перенести в выбранную группу'
+
+    def delete_posts(self, request, queryset):
+        self.apply_bulk(
+            request, bulk.DELETE_POSTS, queryset, 'Удалено постов'
+        )
+    delete_posts.short_description = 'Удалить выбранные посты'
+
+
+class CommentAdmin(LargeTableAdmin):
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    autocomplete_fields = ('author', 'post')
+    search_fields = ('text',)
+    list_filter = ('created',)
+    actions = ('delete_comments',)
+
+    def delete_comments(self, request, queryset):
+        self.apply_bulk(
+            request, bulk.DELETE_COMMENTS, queryset, 'Удалено комментариев'
+        )
+    delete_comments.short_description = 'Удалить выбранные комментарии'
+
+
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+    prepopulated_fields = {'slug': ('title',)}
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
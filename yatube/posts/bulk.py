@@ -0,0 +1,129 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching, counters, jobs, thumbnails
+from .models import Comment, Post, TimelineEntry
+
+MOVE_POSTS = 'posts.move'
+DELETE_POSTS = 'posts.delete'
+DELETE_COMMENTS = 'comments.delete'
+
+
+def _raw_delete(queryset):
+    # один DELETE без сборщика каскада и сигналов на каждую строку
+    return queryset._raw_delete(queryset.db)
+
+
+def move_posts(post_ids, group_id):
+    """Переносит посты в группу (None — из группы); возвращает их число."""
+    moved = 0
+    for batch in counters.batches(post_ids, settings.BULK_BATCH_SIZE):
+        with transaction.atomic():
+            rows = list(Post.objects.select_for_update().filter(
+                id__in=batch
+            ).exclude(group_id=group_id).values_list(
+                'id', 'author_id', 'group_id'
+            ))
+            if not rows:
+                continue
+            Post.objects.filter(id__in=[row[0] for row in rows]).update(
+                group_id=group_id, updated=timezone.now()
+            )
+            for old_group_id, total in Counter(
+                row[2] for row in rows
+            ).items():
+                counters.change_group(old_group_id, -total)
+            counters.change_group(group_id, len(rows))
+        caching.invalidate_posts(
+            {row[1] for row in rows}, {row[2] for row in rows} | {group_id}
+        )
+        moved += len(rows)
+    return moved
+
+
+def delete_posts(post_ids):
+    """Удаляет посты с комментариями и записями лент; возвращает их число."""
+    deleted = 0
+    for batch in counters.batches(post_ids, settings.BULK_BATCH_SIZE):
+        with transaction.atomic():
+            rows = list(Post.objects.select_for_update().filter(
+                id__in=batch
+            ).values_list('author_id', 'group_id', 'image'))
+            if not rows:
+                continue
+            for model in (Comment, TimelineEntry):
+                _raw_delete(model.objects.filter(post_id__in=batch))
+            _raw_delete(Post.objects.filter(id__in=batch))
+            for author_id, total in Counter(row[0] for row in rows).items():
+                counters.change_user(author_id, 'posts_count', -total)
+            for group_id, total in Counter(row[1] for row in rows).items():
+                counters.change_group(group_id, -total)
+        for name, total in Counter(row[2] for row in rows).items():
+            thumbnails.release(name, total)
+        caching.invalidate_posts(
+            {row[0] for row in rows}, {row[1] for row in rows}
+        )
+        deleted += len(rows)
+    return deleted
+
+
+def delete_comments(comment_ids):
+    """Удаляет комментарии; возвращает их число."""
+    deleted = 0
+    for batch in counters.batches(comment_ids, settings.BULK_BATCH_SIZE):
+        with transaction.atomic():
+            comments = Comment.objects.filter(id__in=batch)
+            post_ids = list(comments.values_list('post_id', flat=True))
+            _raw_delete(comments)
+            for post_id, total in Counter(post_ids).items():
+                counters.change_post(post_id, -total)
+        deleted += len(post_ids)
+    return deleted
+
+
+ACTIONS = {
+    MOVE_POSTS: move_posts,
+    DELETE_POSTS: delete_posts,
+    DELETE_COMMENTS: delete_comments,
+}
+
+
+def apply(kind, queryset, **params):
+    """Применяет действие kind к строкам выборки.
+
+    Возвращает (число строк, число задач). До BULK_INLINE_LIMIT строк
+    обрабатываются сразу, и задач 0; выборка больше ставится в очередь
+    задачами по BULK_INLINE_LIMIT id, а число строк — сколько их было
+    в выборке.
+    """
+    limit = settings.BULK_INLINE_LIMIT
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    first = list(ids[:limit + 1])
+    if len(first) <= limit:
+        return ACTIONS[kind](first, **params), 0
+    total = queued = 0
+    for batch in counters.batches(ids.iterator(), limit):
+        jobs.enqueue(kind, dict(params, ids=batch))
+        total += len(batch)
+        queued += 1
+    return total, queued
+
+
+# действия только пишут в БД и сбрасывают кэш, поэтому выполняются в done,
+# в основном процессе воркера, а не в процессе из пула
+@jobs.register_done(MOVE_POSTS)
+def _move_posts_job(payload):
+    move_posts(payload['ids'], payload['group_id'])
+
+
+@jobs.register_done(DELETE_POSTS)
+def _delete_posts_job(payload):
+    delete_posts(payload['ids'])
+
+
+@jobs.register_done(DELETE_COMMENTS)
+def _delete_comments_job(payload):
+    delete_comments(payload['ids'])
@@ -0,0 +1,267 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+from .models import Follow, Post
+from .timeline import celebrity_ids
+
+INDEX = 'index'
+PAGE_EVENTS = ('hit', 'miss', 'stale', 'refresh')
+
+
+def feed_namespace(user_id):
+    return f'feed:{user_id}'
+
+
+def profile_namespace(author_id):
+    return f'profile:{author_id}'
+
+
+def group_namespace(group_id):
+    return f'group:{group_id}'
+
+
+def _generation_key(namespace):
+    return f'generation:{namespace}'
+
+
+def generations(*namespaces):
+    """Текущие поколения пространств имён, входят в ключи их записей.
+
+    Начальное значение берётся от времени, а не с единицы: если ключ
+    поколения вытеснят из кэша, старые записи не оживут.
+    """
+    keys = [_generation_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def generation(namespace):
+    return generations(namespace)[0]
+
+
+def invalidate(*namespaces):
+    """Делает недоступными все записи перечисленных пространств имён."""
+    cache.set_many({
+        _generation_key(namespace): time.time_ns()
+        for namespace in namespaces
+    }, None)
+
+
+def invalidate_feeds(author_id):
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator()
+    batch = []
+    for user_id in followers:
+        batch.append(feed_namespace(user_id))
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            invalidate(*batch)
+            batch = []
+    if batch:
+        invalidate(*batch)
+
+
+def invalidate_post(post, previous_group_id=None):
+    """Сбрасывает списки, в которых виден пост."""
+    invalidate_posts({post.author_id}, {post.group_id, previous_group_id})
+
+
+def invalidate_posts(author_ids, group_ids):
+    """Сбрасывает списки постов этих авторов и групп, каждый один раз.
+
+    Ленты подписчиков знаменитостей не трогаем: в их ключ входит
+    поколение профиля знаменитости.
+    """
+    namespaces = {INDEX}
+    namespaces.update(profile_namespace(author_id) for author_id in author_ids)
+    namespaces.update(
+        group_namespace(group_id) for group_id in group_ids
+        if group_id is not None
+    )
+    invalidate(*namespaces)
+    celebrities = celebrity_ids()
+    for author_id in author_ids:
+        if author_id not in celebrities:
+            invalidate_feeds(author_id)
+
+
+def invalidate_follow(user, author):
+    """Сбрасывает ленту пользователя и страницу автора."""
+    invalidate(feed_namespace(user.id), profile_namespace(author.id))
+
+
+def card_key(post):
+    return f'card:{post.id}:{post.updated.timestamp()}'
+
+
+def post_cards(posts):
+    """Пары (пост, HTML карточки) для страницы постов.
+
+    Готовые карточки достаются одним get_many; в ключ входит время
+    изменения поста, поэтому правка поста сама делает старую
+    карточку недоступной.
+    """
+    posts = list(posts)
+    keys = {post.id: card_key(post) for post in posts}
+    cards = cache.get_many(list(keys.values()))
+    missing = [post for post in posts if keys[post.id] not in cards]
+    pictures = thumbnails.pictures(missing)
+    rendered = {}
+    for post in missing:
+        rendered[keys[post.id]] = render_to_string(
+            'posts/includes/post.html',
+            {'post': post, 'picture': pictures[post.id]}
+        )
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return [(post, mark_safe(cards[keys[post.id]])) for post in posts]
+
+
+def invalidate_cards(author_id):
+    """Удаляет карточки всех постов автора, например после смены имени."""
+    posts = Post.objects.filter(author_id=author_id).only(
+        'id', 'updated'
+    ).iterator()
+    batch = []
+    for post in posts:
+        batch.append(card_key(post))
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            cache.delete_many(batch)
+            batch = []
+    if batch:
+        cache.delete_many(batch)
+
+
+def _count(event):
+    key = f'page_cache:stats:{event}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def page_cache_stats():
+    """Счётчики кэша страниц: hit, miss, stale и refresh."""
+    keys = {event: f'page_cache:stats:{event}' for event in PAGE_EVENTS}
+    found = cache.get_many(list(keys.values()))
+    return {event: found.get(key, 0) for event, key in keys.items()}
+
+
+def _store(key, response, timeout, delta):
+    cache.set(key, {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': list(response.items()),
+        'expires': time.time() + timeout,
+        'delta': delta,
+    }, timeout + settings.PAGE_CACHE_GRACE)
+
+
+def _restore(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    return response
+
+
+def _expiring(entry):
+    """Вероятностный ранний пересчёт (XFetch).
+
+    Чем ближе срок жизни записи и чем дольше она считалась, тем
+    вероятнее, что запрос возьмётся пересчитать её заранее.
+    """
+    gap = -entry['delta'] * settings.PAGE_CACHE_BETA * math.log(
+        1.0 - random.random()
+    )
+    return time.time() + gap >= entry['expires']
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + settings.PAGE_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _cached(entry, event):
+    _count(event)
+    response = _restore(entry)
+    response['X-Cache'] = event
+    return response
+
+
+def _serve(key, timeout, compute):
+    entry = cache.get(key)
+    if entry is not None and not _expiring(entry):
+        return _cached(entry, 'hit')
+    lock = f'{key}:lock'
+    locked = cache.add(lock, 1, settings.PAGE_CACHE_LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            expired = time.time() >= entry['expires']
+            return _cached(entry, 'stale' if expired else 'hit')
+        entry = _wait_for(key)
+        if entry is not None:
+            return _cached(entry, 'hit')
+    event = 'miss' if entry is None else 'refresh'
+    _count(event)
+    try:
+        started = time.monotonic()
+        response = compute()
+        if (not response.streaming and response.status_code == 200
+                and not response.cookies):
+            _store(key, response, timeout, time.monotonic() - started)
+    finally:
+        if locked:
+            cache.delete(lock)
+    response['X-Cache'] = event
+    return response
+
+
+def cache_listing(timeout, namespaces):
+    """Кэш страниц списков, заменяющий cache_page.
+
+    namespaces получает те же аргументы, что и view, и возвращает
+    пространства имён страницы; invalidate() любого из них сбрасывает
+    закэшированные страницы, поэтому хранить их можно долго.
+    Страницу пересчитывает один запрос (блокировка в кэше), остальные
+    тем временем получают устаревшую копию или ждут первую.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            names = namespaces(request, *args, **kwargs)
+            key = 'page:' + hashlib.md5(':'.join([
+                *(
+                    f'{name}:{value}'
+                    for name, value in zip(names, generations(*names))
+                ),
+                str(request.user.id),
+                request.get_full_path(),
+            ]).encode()).hexdigest()
+            return _serve(
+                key, timeout, lambda: view(request, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
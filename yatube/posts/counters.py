@@ -0,0 +1,121 @@
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+
+
+def _change(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_user(user_id, field, delta):
+    """Атомарно меняет счётчик пользователя.
+
+    Строку не создаёт: её может не быть, например, пока каскад удаляет
+    самого пользователя. Пропавшие строки восстанавливает
+    manage.py repair_counters.
+    """
+    _change(UserStats.objects.filter(user_id=user_id), field, delta)
+
+
+def change_post(post_id, delta):
+    _change(Post.objects.filter(id=post_id), 'comments_count', delta)
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        _change(Group.objects.filter(id=group_id), 'posts_count', delta)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+def _counts(model, field, ids):
+    return dict(
+        model.objects.filter(**{f'{field}__in': ids}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values_list(field, 'total')
+    )
+
+
+def recount(queryset, field, model, key, outer='pk'):
+    """Пересчитывает счётчик строк queryset одним UPDATE с подзапросом.
+
+    Значение — число строк model, у которых key равен outer строки.
+    """
+    total = model.objects.filter(**{key: OuterRef(outer)}).order_by().values(
+        key
+    ).annotate(total=Count('pk')).values('total')
+    return queryset.update(**{field: Coalesce(Subquery(total), 0)})
+
+
+def repair_users(user_ids):
+    user_ids = list(
+        User.objects.filter(id__in=user_ids).values_list('id', flat=True)
+    )
+    with transaction.atomic():
+        existing = set(UserStats.objects.filter(
+            user_id__in=user_ids
+        ).values_list('user_id', flat=True))
+        UserStats.objects.bulk_create(
+            UserStats(user_id=user_id)
+            for user_id in user_ids if user_id not in existing
+        )
+        counts = {
+            name: _counts(model, field, user_ids)
+            for name, (model, field) in USER_COUNTERS.items()
+        }
+        stats = list(UserStats.objects.filter(user_id__in=user_ids))
+        for item in stats:
+            for name in USER_COUNTERS:
+                setattr(item, name, counts[name].get(item.user_id, 0))
+        UserStats.objects.bulk_update(stats, list(USER_COUNTERS))
+
+
+def repair_posts(post_ids):
+    counts = _counts(Comment, 'post_id', post_ids)
+    posts = list(Post.objects.filter(id__in=post_ids).only('id'))
+    for post in posts:
+        post.comments_count = counts.get(post.id, 0)
+    Post.objects.bulk_update(posts, ['comments_count'])
+
+
+def repair_groups(group_ids):
+    counts = _counts(Post, 'group_id', group_ids)
+    groups = list(Group.objects.filter(id__in=group_ids))
+    for group in groups:
+        group.posts_count = counts.get(group.id, 0)
+    Group.objects.bulk_update(groups, ['posts_count'])
+
+
+def repair_all(batch_size):
+    """Пересчитывает все счётчики пачками; возвращает число строк."""
+    repaired = {}
+    for model, repair in (
+        (User, repair_users),
+        (Post, repair_posts),
+        (Group, repair_groups),
+    ):
+        ids = model.objects.order_by('id').values_list('id', flat=True)
+        name = model._meta.model_name
+        repaired[name] = 0
+        for batch in batches(ids.iterator(), batch_size):
+            repair(batch)
+            repaired[name] += len(batch)
+    return repaired
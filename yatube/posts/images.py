@@ -0,0 +1,84 @@
+import math
+import os
+import warnings
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        'transparency' in image.info
+    )
+
+
+def _too_large():
+    return ValidationError('Картинка слишком большая.', code='image_too_large')
+
+
+def normalize(upload):
+    """Приводит загруженную картинку к виду, в котором её хранят.
+
+    Размер ограничивается POST_IMAGE_MAX_SIZE по длинной стороне,
+    ориентация из EXIF применяется, а сами метаданные отбрасываются;
+    картинка пересохраняется в JPEG (или PNG, если есть прозрачность)
+    с качеством POST_IMAGE_QUALITY.
+
+    По заголовку отклоняются файлы больше POST_IMAGE_MAX_PIXELS. JPEG
+    декодируется сразу уменьшенным (draft), а всё, что и после этого
+    больше POST_IMAGE_MAX_DECODED_PIXELS, отклоняется до декодирования:
+    так память на одну картинку ограничена. Битые и обрезанные файлы
+    дают ошибку формы, а не 500.
+    """
+    upload.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', Image.DecompressionBombWarning)
+            image = Image.open(upload)
+            with image:
+                output, image_format = _reencode(image)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise _too_large()
+    except (OSError, SyntaxError):
+        raise ValidationError(
+            'Не удалось прочитать картинку: файл повреждён.',
+            code='invalid_image',
+        )
+    extension = '.png' if image_format == 'PNG' else '.jpg'
+    name = os.path.splitext(os.path.basename(upload.name))[0] + extension
+    return SimpleUploadedFile(
+        name, output.getvalue(), Image.MIME[image_format]
+    )
+
+
+def _reencode(image):
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise _too_large()
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    # JPEG можно сразу декодировать в уменьшенном масштабе; рамка тех же
+    # пропорций, иначе масштаб ограничит короткая сторона
+    scale = max_size / max(width, height)
+    image.draft('RGB', (
+        math.ceil(width * scale), math.ceil(height * scale)
+    ))
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_DECODED_PIXELS:
+        raise _too_large()
+    image = ImageOps.exif_transpose(image)
+    if _has_alpha(image):
+        image_format = 'PNG'
+        image = image.convert('RGBA')
+    else:
+        image_format = 'JPEG'
+        image = image.convert('RGB')
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    output = BytesIO()
+    image.save(
+        output, image_format, optimize=True,
+        quality=settings.POST_IMAGE_QUALITY,
+    )
+    return output, image_format
@@ -0,0 +1,122 @@
+import json
+import statistics
+import traceback
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Job
+
+Handler = namedtuple('Handler', 'run done')
+HANDLERS = {}
+
+
+def register(kind, done=None):
+    """Регистрирует обработчик задач типа kind.
+
+    run(payload) выполняется в процессе из пула воркера, со своим
+    соединением с БД; исключение в нём отмечает задачу как failed.
+    done(payload), если задан, вызывается в основном процессе воркера
+    после успешного run и может писать в БД и кэш.
+    """
+    def decorator(run):
+        HANDLERS[kind] = Handler(run, done)
+        return run
+    return decorator
+
+
+def register_done(kind):
+    """Регистрирует задачу, которая целиком выполняется в done.
+
+    Для задач, вся работа которых — запись в БД и кэш: пулу процессов
+    в них делать нечего.
+    """
+    def decorator(done):
+        HANDLERS[kind] = Handler(None, done)
+        return done
+    return decorator
+
+
+def enqueue(kind, payload, unique=False):
+    """Ставит задачу; с unique=True не дублирует такую же из очереди."""
+    payload = json.dumps(payload, sort_keys=True)
+    if unique:
+        job = Job.objects.filter(
+            kind=kind, payload=payload, status=Job.PENDING
+        ).first()
+        if job is not None:
+            return job
+    return Job.objects.create(kind=kind, payload=payload)
+
+
+def claim(limit):
+    """Забирает до limit задач из очереди, не деля их с другими воркерами."""
+    claimed = []
+    ids = Job.objects.filter(status=Job.PENDING).order_by(
+        'created', 'id'
+    ).values_list('id', flat=True)[:limit]
+    for job_id in ids:
+        now = timezone.now()
+        if Job.objects.filter(id=job_id, status=Job.PENDING).update(
+            status=Job.RUNNING, started=now
+        ):
+            claimed.append(Job.objects.get(id=job_id))
+    return claimed
+
+
+def execute(job):
+    """Выполняет задачу; возвращает текст ошибки или None."""
+    run = HANDLERS[job.kind].run
+    if run is None:
+        return None
+    try:
+        run(json.loads(job.payload))
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+def complete(job, error=None):
+    """Вызывает done после успешного run и записывает итог задачи.
+
+    Исключение в done, как и в run, отмечает задачу как failed, а не
+    оставляет её в running.
+    """
+    done = HANDLERS[job.kind].done
+    if error is None and done is not None:
+        try:
+            done(json.loads(job.payload))
+        except Exception:
+            error = traceback.format_exc()
+    job.status = Job.FAILED if error else Job.DONE
+    job.error = error or ''
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished'])
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, зависшие у упавшего воркера."""
+    return Job.objects.filter(
+        status=Job.RUNNING,
+        started__lt=timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT),
+    ).update(status=Job.PENDING, started=None)
+
+
+def stats(recent=100):
+    """Глубина очереди и средние ожидание и выполнение, в секундах."""
+    result = {
+        status: Job.objects.filter(status=status).count()
+        for status, _ in Job.STATUSES if status != Job.DONE
+    }
+    finished = Job.objects.filter(status=Job.DONE).order_by(
+        '-finished'
+    ).values_list('created', 'started', 'finished')[:recent]
+    waits = [(started - created).total_seconds()
+             for created, started, _ in finished]
+    runs = [(end - started).total_seconds()
+            for _, started, end in finished]
+    result['wait'] = statistics.mean(waits) if waits else None
+    result['run'] = statistics.mean(runs) if runs else None
+    return result
@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+# столько ключей SQLite принимает в одном IN (...)
+SQLITE_MAX_VARIABLES = 900
+
+
+class KVStore(KVStoreBase):
+    """Хранилище метаданных sorl-thumbnail в отдельном файле SQLite.
+
+    Не зависит от кэша Django, поэтому переживает его очистку и
+    перезапуск процессов. Перед файлом стоит LRU процесса размером
+    THUMBNAIL_LOCAL_CACHE_SIZE; get_many() читает миниатюры целой
+    страницы одним запросом, warmup() заполняет LRU при старте.
+
+    Удаление в другом процессе до LRU этого процесса не доходит,
+    поэтому запись в LRU живёт THUMBNAIL_LOCAL_CACHE_TIMEOUT секунд,
+    а потом перечитывается из файла.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = threading.local()
+        self._path = None
+
+    def _connection(self):
+        path = settings.THUMBNAIL_KVSTORE_PATH
+        if path != self._path:
+            with self._lock:
+                self._local.clear()
+                self._path = path
+        # после fork соединение родителя использовать нельзя
+        key = (os.getpid(), path)
+        if getattr(self._thread, 'key', None) != key:
+            connection = sqlite3.connect(path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS kvstore '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+            )
+            self._thread.connection = connection
+            self._thread.key = key
+        return self._thread.connection
+
+    def _remember(self, key, value):
+        expires = time.monotonic() + settings.THUMBNAIL_LOCAL_CACHE_TIMEOUT
+        with self._lock:
+            self._local[key] = (value, expires)
+            self._local.move_to_end(key)
+            while len(self._local) > settings.THUMBNAIL_LOCAL_CACHE_SIZE:
+                self._local.popitem(last=False)
+
+    def _forget(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def get_many(self, image_files):
+        """{image_file.key: ImageFile или None} для всех переданных файлов."""
+        keys = {image_file.key: add_prefix(image_file.key)
+                for image_file in image_files}
+        values = self._get_many_raw(list(keys.values()))
+        return {
+            key: deserialize_image_file(values[raw_key])
+            if values.get(raw_key) else None
+            for key, raw_key in keys.items()
+        }
+
+    def warmup(self, limit=None):
+        """Загружает в LRU последние записанные ключи; возвращает их число."""
+        if limit is None:
+            limit = settings.THUMBNAIL_LOCAL_CACHE_SIZE
+        rows = self._connection().execute(
+            'SELECT key, value FROM kvstore ORDER BY rowid DESC LIMIT ?',
+            [limit],
+        ).fetchall()
+        for key, value in reversed(rows):
+            self._remember(key, value)
+        return len(rows)
+
+    def _get_many_raw(self, keys):
+        connection = self._connection()
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                if key not in self._local:
+                    continue
+                value, expires = self._local[key]
+                if expires > now:
+                    self._local.move_to_end(key)
+                    found[key] = value
+                else:
+                    del self._local[key]
+        missing = [key for key in keys if key not in found]
+        for start in range(0, len(missing), SQLITE_MAX_VARIABLES):
+            batch = missing[start:start + SQLITE_MAX_VARIABLES]
+            rows = connection.execute(
+                'SELECT key, value FROM kvstore WHERE key IN ({})'.format(
+                    ', '.join('?' * len(batch))
+                ),
+                batch,
+            )
+            for key, value in rows:
+                found[key] = value
+                self._remember(key, value)
+        return found
+
+    def _get_raw(self, key):
+        return self._get_many_raw([key]).get(key)
+
+    def _set_raw(self, key, value):
+        with self._connection() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO kvstore (key, value) VALUES (?, ?)',
+                [key, value],
+            )
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        keys = list(keys)
+        with self._connection() as connection:
+            for start in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                batch = keys[start:start + SQLITE_MAX_VARIABLES]
+                connection.execute(
+                    'DELETE FROM kvstore WHERE key IN ({})'.format(
+                        ', '.join('?' * len(batch))
+                    ),
+                    batch,
+                )
+        self._forget(*keys)
+
+    def _find_keys_raw(self, prefix):
+        rows = self._connection().execute(
+            "SELECT key FROM kvstore WHERE key LIKE ? ESCAPE '\\'",
+            [prefix.replace('\\', '\\\\').replace('%', '\\%').replace(
+                '_', '\\_'
+            ) + '%'],
+        )
+        return [key for key, in rows]
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+from sorl.thumbnail import delete
+
+from posts import caching, thumbnails
+from posts.models import Post, StoredImage
+from posts.storage import is_content_addressed
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище по содержимому: одинаковые '
+        'файлы склеиваются, счётчики ссылок пересчитываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, сколько файлов будет перенесено.',
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = [
+            name for name in Post.objects.exclude(image='').order_by(
+            ).values_list('image', flat=True).distinct()
+            if not is_content_addressed(name)
+        ]
+        moved = {}
+        missing = 0
+        for name in names:
+            if not storage.exists(name):
+                missing += 1
+                continue
+            if options['dry_run']:
+                moved[name] = None
+                continue
+            with storage.open(name) as content:
+                moved[name] = storage.save(name, content)
+            posts = Post.objects.filter(image=name)
+            affected = list(posts.only('id', 'author_id', 'group_id'))
+            posts.update(
+                image=moved[name], thumbnails_ready=False,
+                updated=timezone.now(),
+            )
+            for post in affected:
+                caching.invalidate_post(post)
+            # старый файл вместе с его миниатюрами
+            delete(name)
+        if not options['dry_run']:
+            self.schedule(set(moved.values()))
+            self.count_references()
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {len(moved)}, уникальных: '
+            f'{len(set(moved.values()))}, не найдено: {missing}'
+        ))
+
+    def schedule(self, names):
+        for name in names:
+            post = Post.objects.filter(image=name).first()
+            thumbnails.schedule(post, name)
+            Post.objects.filter(image=name).update(
+                thumbnails_ready=post.thumbnails_ready
+            )
+
+    def count_references(self):
+        counts = dict(
+            Post.objects.exclude(image='').order_by().values(
+                'image'
+            ).annotate(total=Count('id')).values_list('image', 'total')
+        )
+        counts = {
+            name: total for name, total in counts.items()
+            if is_content_addressed(name)
+        }
+        StoredImage.objects.exclude(name__in=counts).delete()
+        existing = dict(StoredImage.objects.values_list('name', 'id'))
+        StoredImage.objects.bulk_create(
+            StoredImage(name=name) for name in counts if name not in existing
+        )
+        images = list(StoredImage.objects.all())
+        for image in images:
+            image.references = counts[image.name]
+        StoredImage.objects.bulk_update(images, ['references'], 1000)
@@ -0,0 +1,181 @@
+import csv
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from posts.models import Comment, Follow, Post
+
+# колонки выгрузки: имя -> поле для values(). Посты и комментарии
+# в этом виде принимает import_data, но image он не переносит, а подписки
+# не импортирует вовсе
+EXPORTS = {
+    'posts': (Post, 'pub_date', {
+        'id': 'id',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'image': 'image',
+    }),
+    'comments': (Comment, 'created', {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follows': (Follow, None, {
+        'id': 'id',
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+
+def rows(queryset, columns, after, batch_size):
+    """Строки по возрастанию id, пачками по ключу id > последнего."""
+    fields = list(columns.values())
+    while True:
+        batch = queryset.filter(id__gt=after).order_by('id').values_list(
+            *fields
+        )[:batch_size]
+        count = 0
+        for values in batch.iterator(chunk_size=batch_size):
+            count += 1
+            after = values[0]
+            yield dict(zip(columns, values))
+        if count < batch_size:
+            return
+
+
+def load_state(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты, комментарии или подписки в JSONL или CSV, '
+        'сжатые gzip. Таблица читается пачками по ключу id, без загрузки '
+        'в память. С --state выгружаются только строки новее прошлой '
+        'выгрузки (по id), а отметка сохраняется после успешной записи. '
+        'Строки, вставленные позже с id ниже отметки (import_data с '
+        'явными id), в такую выгрузку не попадут: их выгружают '
+        'с --since-id или --since.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=EXPORTS)
+        parser.add_argument(
+            '-o', '--output', default=None,
+            help='Файл выгрузки (по умолчанию <model>.<format>.gz).',
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'), default='jsonl'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--since-id', type=int, default=None,
+            help='Выгрузить строки с id больше этого.',
+        )
+        parser.add_argument(
+            '--since', default=None,
+            help='Выгрузить строки, созданные после этой даты (ISO 8601).',
+        )
+        parser.add_argument(
+            '--state', default=None,
+            help='JSON-файл с отметками последних выгруженных id.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        model_name = options['model']
+        model, date_field, columns = EXPORTS[model_name]
+        data_format = options['format']
+        output = options['output'] or f'{model_name}.{data_format}.gz'
+        state = load_state(options['state'])
+        after = options['since_id']
+        if after is None:
+            after = state.get(model_name, 0)
+        queryset = model.objects.all()
+        if options['since']:
+            queryset = self.since(
+                queryset, model_name, date_field, options['since']
+            )
+
+        started = time.perf_counter()
+        # пишем во временный файл, чтобы оборванная выгрузка не подменила
+        # прошлую и не сдвинула отметку
+        temp_path = output + '.part'
+        try:
+            with gzip.open(
+                temp_path, 'wt', encoding='utf-8', newline=''
+            ) as file:
+                exported, last_id = self.write(
+                    file, data_format, queryset, columns, after,
+                    options['batch_size'],
+                )
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        os.replace(temp_path, output)
+        if options['state']:
+            state[model_name] = last_id
+            with open(options['state'], 'w', encoding='utf-8') as file:
+                json.dump(state, file)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{model_name}: выгружено {exported} в {output} за '
+            f'{elapsed:.1f} с ({exported / max(elapsed, 1e-9):.0f} в '
+            f'секунду), последний id {last_id}'
+        ))
+
+    def since(self, queryset, model_name, date_field, value):
+        """Строки queryset, созданные после даты value (ISO 8601).
+
+        Дата без времени означает её полночь в текущем часовом поясе.
+        """
+        if date_field is None:
+            raise CommandError(f'У {model_name} нет даты создания.')
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError('--since: ожидается дата ISO 8601.')
+            since = datetime.combine(day, datetime.min.time())
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return queryset.filter(**{f'{date_field}__gt': since})
+
+    def write(self, file, data_format, queryset, columns, after,
+              batch_size):
+        """Пишет строки в file; возвращает их число и последний id."""
+        exported = 0
+        last_id = after
+        writer = None
+        if data_format == 'csv':
+            writer = csv.DictWriter(file, fieldnames=list(columns))
+            writer.writeheader()
+        for row in rows(queryset, columns, after, batch_size):
+            last_id = row['id']
+            row = {
+                name: value.isoformat() if hasattr(value, 'isoformat')
+                else value
+                for name, value in row.items()
+            }
+            if writer is None:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            else:
+                writer.writerow(row)
+            exported += 1
+        return exported, last_id
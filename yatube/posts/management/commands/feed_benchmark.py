@@ -0,0 +1,127 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from posts import counters, timeline
+from posts.models import Follow, Post, User
+from posts.utils import POSTS_PER_PAGE
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет запись и чтение ленты подписок на синтетических графах '
+        '«знаменитости» и «длинный хвост». Данные создаются в транзакции '
+        'и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=2000)
+        parser.add_argument('--celebrities', type=int, default=5)
+        parser.add_argument('--long-tail', type=int, default=500,
+                            help='Сколько малоизвестных авторов читает '
+                                 'пользователь.')
+        parser.add_argument('--posts', type=int, default=20,
+                            help='Постов у каждого автора.')
+        parser.add_argument('--threshold', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.options = options
+        try:
+            with transaction.atomic():
+                self.run()
+                raise Rollback
+        except Rollback:
+            pass
+        cache.delete_many([
+            timeline.CELEBRITIES_CACHE_KEY,
+            timeline.KNOWN_CELEBRITIES_CACHE_KEY,
+        ])
+
+    def run(self):
+        options = self.options
+        readers = self.create_users('reader', options['readers'])
+        celebrities = self.create_users('celebrity', options['celebrities'])
+        long_tail = self.create_users('author', options['long_tail'])
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=celebrity)
+            for reader in readers for celebrity in celebrities
+        )
+        heavy_reader, tail_reader = readers[:2]
+        Follow.objects.bulk_create(
+            Follow(user=tail_reader, author=author) for author in long_tail
+        )
+        # знаменитости выбираются по счётчику подписчиков
+        counters.repair_users(
+            [author.id for author in celebrities + long_tail]
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=author)
+            for author in celebrities + long_tail
+            for number in range(options['posts'])
+        )
+        graphs = (
+            ('знаменитости', heavy_reader, celebrities[0]),
+            ('длинный хвост', tail_reader, long_tail[0]),
+        )
+        modes = (
+            ('join', 10 ** 9),
+            ('push', 10 ** 9),
+            ('hybrid', options['threshold']),
+        )
+        for mode, threshold in modes:
+            with override_settings(FEED_FANOUT_THRESHOLD=threshold):
+                cache.delete(timeline.CELEBRITIES_CACHE_KEY)
+                if mode != 'join':
+                    timeline.rebuild(heavy_reader)
+                    timeline.rebuild(tail_reader)
+                for graph, reader, author in graphs:
+                    self.report(mode, graph, reader, author)
+
+    def create_users(self, prefix, count):
+        User.objects.bulk_create(
+            User(username=f'bench-{prefix}-{number}')
+            for number in range(count)
+        )
+        return list(
+            User.objects.filter(username__startswith=f'bench-{prefix}-')
+        )
+
+    def measure(self, func):
+        timings = []
+        for _ in range(self.options['repeat']):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def report(self, mode, graph, reader, author):
+        if mode == 'join':
+            def read_page():
+                return list(Post.objects.filter(
+                    author__following__user=reader
+                ).order_by('-pub_date')[:POSTS_PER_PAGE])
+        else:
+            def read_page():
+                return list(timeline.feed(reader).get_cursor_page())
+        read = self.measure(read_page)
+        if mode == 'join':
+            write = self.measure(
+                lambda: Post.objects.bulk_create([Post(author=author)])
+            )
+        else:
+            write = self.measure(lambda: Post.objects.create(
+                text='Новый пост', author=author
+            ))
+        self.stdout.write(
+            f'{mode:>6} | {graph:<14} | чтение {read:8.2f} мс | '
+            f'запись {write:8.2f} мс'
+        )
@@ -0,0 +1,52 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def prepare(name):
+    thumbnails.generate(name)
+    return name, thumbnails.describe(name)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры, размеры и заглушки картинок уже '
+        'опубликованных постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='Сколько процессов режут картинки (по умолчанию по числу '
+                 'ядер; 1 — без пула, в текущем процессе).',
+        )
+        parser.add_argument('--chunk-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(image='').order_by().values_list(
+                'image', flat=True
+            ).distinct()
+        )
+        if options['processes'] == 1:
+            done = list(map(prepare, names))
+        else:
+            # дочерние процессы не должны делить соединения с родителем
+            connections.close_all()
+            with ProcessPoolExecutor(options['processes']) as executor:
+                done = list(executor.map(
+                    prepare, names, chunksize=options['chunk_size'],
+                ))
+        for name, description in done:
+            if description is not None:
+                Post.objects.filter(
+                    image=name, image_placeholder=''
+                ).update(**description)
+        thumbnails.mark_ready(names)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {len(done)}'
+        ))
@@ -0,0 +1,326 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import caching, counters, timeline
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+MODELS = ('users', 'groups', 'posts', 'comments')
+
+
+def insert(model, objects):
+    """bulk_create, в котором даты берутся из самих объектов.
+
+    INSERT идёт с raw=True, как у loaddata: pre_save полей не
+    вызывается, и auto_now_add не подменяет дату импортируемой записи.
+    Сами поля модели общие для всех потоков процесса, их не трогаем.
+    """
+    meta = model._meta
+    for with_pk in (True, False):
+        batch = [obj for obj in objects if (obj.pk is not None) == with_pk]
+        if not batch:
+            continue
+        fields = [
+            field for field in meta.concrete_fields
+            if with_pk or field is not meta.pk
+        ]
+        size = connection.ops.bulk_batch_size(fields, batch)
+        for part in counters.batches(batch, size):
+            model.objects._insert(part, fields=fields, raw=True)
+
+
+def open_text(path):
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_records(stream, data_format, reject):
+    """Записи файла по одной: (номер строки, словарь полей).
+
+    Строки, которые не разбираются как JSON, передаются в reject.
+    """
+    if data_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            reject(line_num, f'не JSON: {error}')
+            continue
+        yield line_num, record
+
+
+class SkipRecord(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует пользователей, группы, посты или комментарии из '
+        'JSONL или CSV (можно .gz, «-» — stdin). Файл читается потоком и '
+        'пишется bulk_create пачками, каждая в своей транзакции. Авторы '
+        'указываются по username, группы по slug, посты комментариев — по '
+        'id, заданному при импорте постов. Посты и комментарии без id '
+        'пропускаются: по id, как пользователи по username и группы по '
+        'slug, узнаются уже существующие записи, поэтому импорт можно '
+        'перезапустить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=MODELS)
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'), default=None,
+            help='Формат файла (по умолчанию по расширению).',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        path = options['path']
+        name = path[:-len('.gz')] if path.endswith('.gz') else path
+        data_format = options['format'] or (
+            'csv' if name.endswith('.csv') else 'jsonl'
+        )
+        self.model = options['model']
+        # затронутые авторы и группы: их списки и ленты обновляются в конце
+        self.authors = set()
+        self.groups = set()
+        created = skipped = self.rejected = 0
+        started = time.perf_counter()
+        with open_text(path) as stream:
+            records = self.objects(
+                read_records(stream, data_format, self.reject)
+            )
+            for batch in counters.batches(records, options['batch_size']):
+                done, missed = getattr(self, f'import_{self.model}')(batch)
+                created += done
+                skipped += missed
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{self.model}: {created}')
+        self.finish()
+        skipped += self.rejected
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.model}: создано {created}, пропущено {skipped} '
+            f'за {elapsed:.1f} с ({created / max(elapsed, 1e-9):.0f} в '
+            f'секунду)'
+        ))
+
+    def objects(self, records):
+        """Только записи-объекты: строку JSONL [1, 2] не во что разобрать."""
+        for line_num, record in records:
+            if isinstance(record, dict):
+                yield line_num, record
+            else:
+                self.reject(line_num, 'не объект')
+
+    def reject(self, line_num, reason):
+        """Пропускает строку, которая не дошла до пачки."""
+        self.rejected += 1
+        self.stderr.write(f'Строка {line_num}: пропущена ({reason})')
+
+    def build(self, batch, make):
+        """Объекты пачки; неподходящие записи пропускаются с сообщением."""
+        objects = []
+        for line_num, record in batch:
+            try:
+                objects.append(make(record))
+            except (SkipRecord, KeyError, TypeError, ValueError) as error:
+                self.stderr.write(f'Строка {line_num}: пропущена ({error!r})')
+        return objects
+
+    def key(self, record, name):
+        value = record.get(name)
+        return int(value) if value not in (None, '') else None
+
+    def record_id(self, record):
+        """id поста или комментария: без него повтор не распознать."""
+        record_id = self.key(record, 'id')
+        if record_id is None:
+            raise SkipRecord('нет id')
+        return record_id
+
+    def date(self, record, name):
+        value = record.get(name)
+        if not value:
+            return timezone.now()
+        date = parse_datetime(value)
+        if date is None:
+            raise SkipRecord(f'{name}: не дата')
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date)
+        return date
+
+    def existing(self, model, field, values):
+        return set(model.objects.filter(
+            **{f'{field}__in': values}
+        ).values_list(field, flat=True))
+
+    def fresh(self, objects, model, field):
+        """Объекты, ключа которых ещё нет ни в БД, ни раньше в пачке."""
+        keys = [getattr(obj, field) for obj in objects]
+        seen = self.existing(model, field, keys)
+        result = []
+        for obj, key in zip(objects, keys):
+            if key not in seen:
+                result.append(obj)
+                seen.add(key)
+        return result
+
+    def import_users(self, batch):
+        def make(record):
+            if not record['username']:
+                raise SkipRecord('пустой username')
+            return User(
+                username=record['username'],
+                first_name=record.get('first_name') or '',
+                last_name=record.get('last_name') or '',
+                email=record.get('email') or '',
+                date_joined=self.date(record, 'date_joined'),
+                password=make_password(None),
+            )
+        users = self.fresh(self.build(batch, make), User, 'username')
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            UserStats.objects.bulk_create(
+                UserStats(user_id=user_id)
+                for user_id in User.objects.filter(username__in=[
+                    user.username for user in users
+                ]).values_list('id', flat=True)
+            )
+        return len(users), len(batch) - len(users)
+
+    def import_groups(self, batch):
+        def make(record):
+            if not record['slug'] or not record['title']:
+                raise SkipRecord('пустой slug или title')
+            return Group(
+                slug=record['slug'],
+                title=record['title'],
+                description=record.get('description') or '',
+            )
+        groups = self.fresh(self.build(batch, make), Group, 'slug')
+        Group.objects.bulk_create(groups)
+        return len(groups), len(batch) - len(groups)
+
+    def lookup(self, batch, model, field, name):
+        """{естественный ключ: id} для значений поля name в пачке."""
+        values = {record.get(name) for _, record in batch} - {None, ''}
+        return dict(model.objects.filter(
+            **{f'{field}__in': values}
+        ).values_list(field, 'id'))
+
+    def import_posts(self, batch):
+        authors = self.lookup(batch, User, 'username', 'author')
+        groups = self.lookup(batch, Group, 'slug', 'group')
+
+        def make(record):
+            if not record['text']:
+                raise SkipRecord('пустой текст')
+            if record['author'] not in authors:
+                raise SkipRecord(f'нет автора {record["author"]}')
+            if record.get('group') and record['group'] not in groups:
+                raise SkipRecord(f'нет группы {record["group"]}')
+            pub_date = self.date(record, 'pub_date')
+            return Post(
+                id=self.record_id(record),
+                text=record['text'],
+                author_id=authors[record['author']],
+                group_id=groups.get(record.get('group')),
+                pub_date=pub_date,
+                updated=pub_date,
+            )
+        built = self.build(batch, make)
+        posts = self.fresh(built, Post, 'id')
+        with transaction.atomic():
+            insert(Post, posts)
+            # по одному UPDATE на пачку вместо UPDATE на автора и группу
+            author_ids = {post.author_id for post in posts}
+            group_ids = {post.group_id for post in posts} - {None}
+            counters.recount(
+                UserStats.objects.filter(user_id__in=author_ids),
+                'posts_count', Post, 'author_id', 'user_id',
+            )
+            counters.recount(
+                Group.objects.filter(id__in=group_ids),
+                'posts_count', Post, 'group_id',
+            )
+        # и авторы уже импортированных постов: если прошлый запуск
+        # оборвался, ленты и кэш после него не обновились
+        self.authors.update(post.author_id for post in built)
+        self.groups.update(post.group_id for post in built)
+        self.groups.discard(None)
+        return len(posts), len(batch) - len(posts)
+
+    def import_comments(self, batch):
+        authors = self.lookup(batch, User, 'username', 'author')
+        post_ids = self.existing(Post, 'id', [
+            record['post'] for _, record in batch
+            if str(record.get('post') or '').isdigit()
+        ])
+
+        def make(record):
+            if not record['text']:
+                raise SkipRecord('пустой текст')
+            if record['author'] not in authors:
+                raise SkipRecord(f'нет автора {record["author"]}')
+            post_id = self.key(record, 'post')
+            if post_id not in post_ids:
+                raise SkipRecord(f'нет поста {record["post"]}')
+            return Comment(
+                id=self.record_id(record),
+                post_id=post_id,
+                author_id=authors[record['author']],
+                text=record['text'],
+                created=self.date(record, 'created'),
+            )
+        comments = self.fresh(self.build(batch, make), Comment, 'id')
+        with transaction.atomic():
+            insert(Comment, comments)
+            counters.recount(
+                Post.objects.filter(
+                    id__in={comment.post_id for comment in comments}
+                ),
+                'comments_count', Comment, 'post_id',
+            )
+        return len(comments), len(batch) - len(comments)
+
+    def finish(self):
+        if self.model in ('posts', 'comments'):
+            # после явных id последовательность должна идти дальше них
+            model = Post if self.model == 'posts' else Comment
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [model]
+                ):
+                    cursor.execute(sql)
+        if self.authors:
+            caching.invalidate_posts(self.authors, self.groups)
+        # bulk_create не шлёт сигналов: ленты подписчиков дополняем здесь
+        authors = self.authors - timeline.celebrity_ids()
+        for batch in counters.batches(sorted(authors), 500):
+            follows = Follow.objects.filter(
+                author_id__in=batch
+            ).select_related('user', 'author')
+            for follow in follows.iterator():
+                timeline.add_author(follow.user, follow.author)
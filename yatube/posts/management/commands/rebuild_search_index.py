@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов (SQLite FTS5).'
+
+    def handle(self, *args, **options):
+        if not search.supported():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        search.install()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Индекс перестроен.'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк пересчитывать за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        repaired = counters.repair_all(options['batch_size'])
+        for name, total in repaired.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: пересчитано строк {total}'
+            ))
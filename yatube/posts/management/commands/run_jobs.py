@@ -0,0 +1,78 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди (например, миниатюры) '
+        'в пуле процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='Размер пула (по умолчанию по числу ядер; 1 — без пула, '
+                 'в текущем процессе).',
+        )
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и выйти, не дожидаясь новых задач.',
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Показать глубину очереди и задержки и выйти.',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.write_stats()
+            return
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f'Возвращено в очередь: {requeued}')
+        executor = None
+        if options['processes'] != 1:
+            executor = ProcessPoolExecutor(options['processes'])
+        try:
+            self.run(executor, options)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.write_stats()
+
+    def run(self, executor, options):
+        while True:
+            batch = jobs.claim(options['batch_size'])
+            if not batch:
+                if options['once']:
+                    return
+                time.sleep(settings.JOB_POLL_INTERVAL)
+                continue
+            if executor is None:
+                errors = map(jobs.execute, batch)
+            else:
+                # дочерние процессы не должны делить соединения с родителем
+                connections.close_all()
+                errors = executor.map(jobs.execute, batch)
+            for job, error in zip(batch, errors):
+                jobs.complete(job, error)
+
+    def write_stats(self):
+        stats = jobs.stats()
+        latency = ', '.join(
+            f'{label} {stats[name]:.2f} с'
+            for name, label in (('wait', 'ожидание'), ('run', 'выполнение'))
+            if stats[name] is not None
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'В очереди: {stats["pending"]}, выполняется: '
+            f'{stats["running"]}, с ошибкой: {stats["failed"]}'
+            + (f'; в среднем {latency}' if latency else '')
+        ))
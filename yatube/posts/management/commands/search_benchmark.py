@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+from posts.models import Post, User
+
+WORDS = (
+    'город река дорога утро вечер море лес поле книга музыка кино погода '
+    'работа отпуск кофе поезд самолёт горы снег дождь солнце друзья кошка '
+    'собака сад дом школа праздник рецепт футбол выставка'
+).split()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет полнотекстовый поиск на синтетических постах. Данные '
+        'создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if not search.supported():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        self.options = options
+        try:
+            with transaction.atomic():
+                self.run()
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self):
+        options = self.options
+        author = User.objects.create(username='search_benchmark')
+        rng = random.Random(0)
+        started = time.perf_counter()
+        for start in range(0, options['posts'], options['batch_size']):
+            size = min(options['batch_size'], options['posts'] - start)
+            Post.objects.bulk_create(
+                Post(text=' '.join(rng.choices(WORDS, k=12)), author=author)
+                for _ in range(size)
+            )
+        self.stdout.write(
+            f'Постов: {options["posts"]}, загрузка с индексацией: '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+        queries = {
+            'одно частое слово': 'город',
+            'два слова': 'утро кофе',
+            'префикс': 'выстав',
+            'редкое сочетание': 'самолёт рецепт футбол',
+        }
+        for label, query in queries.items():
+            first, after = [], []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                page = search.search_page(query)
+                first.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                search.search_page(query, after=page.next_cursor)
+                after.append(time.perf_counter() - started)
+            self.stdout.write(
+                f'{label}: первая страница {self.summary(first)}; '
+                f'следующая {self.summary(after)}'
+            )
+
+    def summary(self, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        return (
+            f'медиана {statistics.median(timings) * 1000:.1f} мс, '
+            f'p95 {p95 * 1000:.1f} мс'
+        )
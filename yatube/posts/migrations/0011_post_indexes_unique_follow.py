@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:05
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def dedupe_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats = apps.get_model('posts', 'UserStats')
+    duplicates = Follow.objects.order_by().values('user', 'author').annotate(
+        keep=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    users = set()
+    while True:
+        batch = list(duplicates[:BATCH_SIZE])
+        if not batch:
+            break
+        for row in batch:
+            Follow.objects.filter(
+                user=row['user'], author=row['author']
+            ).exclude(id=row['keep']).delete()
+            users.update((row['user'], row['author']))
+    users = list(users)
+    for start in range(0, len(users), BATCH_SIZE):
+        UserStats.objects.filter(
+            user__in=users[start:start + BATCH_SIZE]
+        ).update(
+            followers_count=_count(Follow, 'author'),
+            following_count=_count(Follow, 'user'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_follows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date'], name='posts_post_author__7827da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date'], name='posts_post_group_i_1fdac4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='posts_post_pub_dat_d3c0cd_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_indexes_unique_follow'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='posts_comme_post_id_944a68_idx'),
+        ),
+    ]
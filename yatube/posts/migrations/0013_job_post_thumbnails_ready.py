@@ -0,0 +1,46 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:58
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # старые посты показываются, как раньше, через {% thumbnail %}
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(thumbnails_ready=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_comment_post_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='Тип')),
+                ('payload', models.TextField(verbose_name='Параметры (JSON)')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Состояние')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Поставлено')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Начато')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+            ],
+            options={
+                'verbose_name': 'Фоновая задача',
+                'verbose_name_plural': 'Фоновые задачи',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Миниатюры готовы'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'created'], name='posts_job_status_a3783c_idx'),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:58
+
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from posts.search import install
+    install(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from posts.search import FTS_TABLE, supported
+    if not supported(schema_editor.connection):
+        return
+    for trigger in ('insert', 'delete', 'update'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_description'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, drop_search_index),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -9,11 +11,29 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Посты для списков: автор и группа одним запросом."""
+        return self.select_related('author', 'group')
+
+    def for_detail(self):
+        """Пост для отдельной страницы вместе со счётчиками автора.
+
+        Комментарии сюда не входят: они листаются отдельно, по курсору.
+        """
+        return self.for_listing().select_related('author__stats')
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -38,16 +58,54 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
 
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    thumbnails_ready = models.BooleanField(
+        'Миниатюры готовы',
+        default=False,
+        editable=False
+    )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        editable=False
+    )
+    image_placeholder = models.TextField(
+        'Заглушка картинки',
+        blank=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['author', '-pub_date']),
+            models.Index(fields=['group', '-pub_date']),
+            models.Index(fields=['-pub_date', '-id']),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -73,6 +131,11 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created']),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -85,3 +148,114 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        unique_together = ('user', 'post')
+        indexes = [
+            # лента листается по (pub_date, post) без сортировки
+            models.Index(fields=['user', '-pub_date', '-post']),
+            models.Index(fields=['user', 'author']),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+        indexes = [
+            # по нему выбираются знаменитости для ленты подписок
+            models.Index(fields=['followers_count']),
+        ]
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    kind = models.CharField('Тип', max_length=50)
+    payload = models.TextField('Параметры (JSON)')
+    status = models.CharField(
+        'Состояние',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    created = models.DateTimeField('Поставлено', auto_now_add=True)
+    started = models.DateTimeField('Начато', null=True, blank=True)
+    finished = models.DateTimeField('Завершено', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=['status', 'created']),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.id}'
+
+
+class StoredImage(models.Model):
+    """Файл картинки и число постов, которые на него ссылаются."""
+    name = models.CharField('Файл', max_length=100, unique=True)
+    references = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,114 @@
+import re
+
+from django.core import signing
+from django.db import connection as default_connection
+
+from .models import Post
+from .utils import CURSOR_SALT, POSTS_PER_PAGE, CursorPage, CursorSerializer
+
+FTS_TABLE = 'posts_post_fts'
+
+SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"text, content='posts_post', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert "
+    f"AFTER INSERT ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    f"END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete "
+    f"AFTER DELETE ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); "
+    f"END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update "
+    f"AFTER UPDATE OF text ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    f"VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    f"END",
+)
+
+
+def supported(connection=default_connection):
+    return connection.vendor == 'sqlite'
+
+
+def install(connection=default_connection):
+    """Создаёт индекс FTS5 и триггеры, если их нет.
+
+    SQLite теряет триггеры, когда миграция пересоздаёт таблицу постов,
+    поэтому это вызывается и после каждого migrate.
+    """
+    if not supported(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [FTS_TABLE],
+        )
+        created = cursor.fetchone() is None
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    if created:
+        rebuild(connection)
+
+
+def rebuild(connection=default_connection):
+    """Перестраивает индекс по текущему содержимому таблицы постов."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def match_expression(text):
+    """Запрос FTS5 из слов пользователя: все слова, каждое как префикс."""
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _cursor(post):
+    return signing.dumps(
+        [post.rank, post.id], salt=CURSOR_SALT, serializer=CursorSerializer
+    )
+
+
+def search_page(text, after=None, per_page=POSTS_PER_PAGE):
+    """Страница найденных постов, от самых подходящих (bm25).
+
+    Листается вперёд по курсору (rank, id). Ранги пересчитываются при
+    каждом запросе, поэтому новые посты могут сдвинуть границу страниц.
+    Без FTS5 (не SQLite) ищет подстроку, новые посты первыми.
+    """
+    expression = match_expression(text)
+    if not expression:
+        return CursorPage([], None)
+    if not supported():
+        posts = Post.objects.for_listing().filter(text__icontains=text)
+        return CursorPage(list(posts[:per_page]), None)
+    where = [f'{FTS_TABLE}.rowid = posts_post.id', f'{FTS_TABLE} MATCH %s']
+    params = [expression]
+    if after:
+        try:
+            rank, post_id = signing.loads(
+                after, salt=CURSOR_SALT, serializer=CursorSerializer
+            )
+        except (signing.BadSignature, ValueError):
+            pass
+        else:
+            where.append(
+                f'(bm25({FTS_TABLE}) > %s OR '
+                f'(bm25({FTS_TABLE}) = %s AND posts_post.id > %s))'
+            )
+            params += [rank, rank, post_id]
+    posts = list(Post.objects.for_listing().extra(
+        select={'rank': f'bm25({FTS_TABLE})'},
+        tables=[FTS_TABLE],
+        where=where,
+        params=params,
+    ).order_by('rank', 'id')[:per_page + 1])
+    next_cursor = None
+    if len(posts) > per_page:
+        next_cursor = _cursor(posts[per_page - 1])
+    return CursorPage(posts[:per_page], None, next_cursor=next_cursor)
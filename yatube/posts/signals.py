@@ -0,0 +1,136 @@
+from django.db import connections
+from django.db.models import DEFERRED
+from django.db.models.signals import (
+    post_delete, post_init, post_migrate, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from . import caching, counters, search, thumbnails, timeline
+from .models import Comment, Follow, Post, User, UserStats
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # __dict__, чтобы не подгружать отложенное поле
+    instance._loaded_group_id = instance.__dict__.get('group_id', DEFERRED)
+    instance._loaded_image = thumbnails.image_name(
+        instance.__dict__.get('image')
+    )
+
+
+@receiver(pre_save, sender=Post)
+def remember_upload(sender, instance, raw, **kwargs):
+    # новый файл сохранит хранилище, и ссылку на него возьмёт оно же
+    instance._image_uploaded = (
+        not raw and 'image' in instance.__dict__
+        and bool(instance.image) and not instance.image._committed
+    )
+
+
+@receiver(pre_save, sender=Post)
+def load_deferred_group(sender, instance, **kwargs):
+    # пост загружен через only()/defer() без группы: прежняя — из БД
+    if instance._loaded_group_id is DEFERRED:
+        instance._loaded_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.push_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def track_image(sender, instance, raw, **kwargs):
+    if raw or 'image' not in instance.__dict__:
+        return
+    name = thumbnails.image_name(instance.image)
+    uploaded = instance._image_uploaded
+    if name != instance._loaded_image:
+        if name:
+            if not uploaded:
+                thumbnails.acquire(name)
+            thumbnails.store_description(instance, name)
+            thumbnails.schedule(instance, name)
+        thumbnails.release(instance._loaded_image)
+    elif uploaded:
+        # тот же файл загружен заново: лишнюю ссылку хранилища снимаем
+        thumbnails.release(name)
+    instance._loaded_image = name
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+    elif instance._loaded_group_id != instance.group_id:
+        counters.change_group(instance._loaded_group_id, -1)
+    if created or instance._loaded_group_id != instance.group_id:
+        counters.change_group(instance.group_id, 1)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post(sender, instance, **kwargs):
+    caching.invalidate_post(instance, instance._loaded_group_id)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+    counters.change_group(instance.group_id, -1)
+    caching.invalidate_post(instance)
+    thumbnails.release(thumbnails.image_name(
+        instance.__dict__.get('image')
+    ))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.user_id, 'following_count', 1)
+        counters.change_user(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user(instance.user_id, 'following_count', -1)
+    counters.change_user(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cards(sender, instance, created, update_fields,
+                            **kwargs):
+    names = {'username', 'first_name', 'last_name'}
+    if created or update_fields is not None and not names & update_fields:
+        return
+    caching.invalidate_cards(instance.id)
+    # имя автора есть и в целых страницах списков, а не только в карточках
+    group_ids = set(Post.objects.filter(author_id=instance.id).order_by(
+    ).values_list('group_id', flat=True).distinct())
+    caching.invalidate_posts({instance.id}, group_ids)
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using, **kwargs):
+    if sender.name == 'posts':
+        search.install(connections[using])
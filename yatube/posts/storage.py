@@ -0,0 +1,72 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+CONTENT_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def content_name(directory, digest, extension):
+    return '/'.join(
+        part for part in (directory, digest[:2], digest + extension.lower())
+        if part
+    )
+
+
+def is_content_addressed(name):
+    return bool(name and CONTENT_NAME.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит каждый загруженный файл один раз, под SHA-256 содержимого.
+
+    Файл пишется во временный по кускам, хеш считается по пути; если
+    такое содержимое уже есть, возвращается имя существующего файла.
+    Каталог из upload_to сохраняется: posts/ab/abcd….jpg.
+
+    Сохранение само берёт ссылку на файл (thumbnails.acquire) и под её
+    блокировкой проверяет, что файл есть: иначе последний release
+    другого поста мог бы удалить его между проверкой и сохранением
+    поста. Сигнал сохранения поста эту ссылку второй раз не берёт;
+    если пост так и не сохранится, лишнюю ссылку пересчитает
+    manage.py dedupe_media.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # настоящее имя выбирает _save по содержимому
+        return name
+
+    def _save(self, name, content):
+        directory, original = os.path.split(name)
+        extension = os.path.splitext(original)[1]
+        os.makedirs(self.path(directory), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(
+            dir=self.path(directory), prefix='.upload-'
+        )
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(handle, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = content_name(directory, digest.hexdigest(), extension)
+            path = self.path(name)
+            with transaction.atomic():
+                # thumbnails импортирует модели, а модели — это хранилище
+                from .thumbnails import acquire
+                acquire(name)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(temp_path, path)
+                    os.chmod(path, self.file_permissions_mode or 0o644)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
@@ -0,0 +1,10 @@
+from django import template
+
+from posts import caching
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(page_obj):
+    return caching.post_cards(page_obj)
@@ -0,0 +1,10 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    return {'picture': thumbnails.pictures([post])[post.id]}
@@ -0,0 +1,175 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import bulk, jobs
+from ..models import (
+    Comment, Follow, Group, Job, Post, TimelineEntry, User
+)
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.url = reverse('admin:posts_post_changelist')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def create_posts(self, count):
+        start = User.objects.count()
+        authors = [
+            User.objects.create(username=f'author{start + i}')
+            for i in range(count)
+        ]
+        # у каждой строки своя группа: подпись каждой нужна отдельно
+        groups = [
+            Group.objects.create(title=f'Группа {start + i}',
+                                 slug=f'group{start + i}')
+            for i in range(count)
+        ]
+        Post.objects.bulk_create(
+            Post(text='Пост', author=author, group=group)
+            for author, group in zip(authors, groups)
+        )
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow(self):
+        """Число запросов списка не зависит от числа строк."""
+        self.create_posts(3)
+        few = self.count_queries()
+        self.create_posts(20)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_group_is_autocomplete(self):
+        """Группа в строках — автодополнение, а не список всех групп."""
+        Group.objects.create(title='Чужая', slug='other')
+        self.create_posts(2)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'data-ajax--url', count=2)
+        self.assertNotContains(response, 'Чужая')
+
+    @override_settings(PAGINATOR_ESTIMATE_FROM=1000)
+    def test_estimated_count(self):
+        """На большой таблице количество берётся из статистики БД."""
+        self.create_posts(2)
+        with mock.patch('posts.utils.estimate_count', return_value=5000):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['cl'].result_count, 5000)
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+    def test_date_hierarchy_is_cached(self):
+        """Годы для date_hierarchy считаются один раз."""
+        self.create_posts(1)
+        admin_queryset = self.client.get(self.url).context['cl'].queryset
+        years = admin_queryset.dates('pub_date', 'year')
+        self.assertEqual(len(years), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(admin_queryset.dates('pub_date', 'year'), years)
+
+
+class BulkActionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other = Group.objects.create(title='Другая', slug='other')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=self.author, group=self.group
+            )
+            for i in range(3)
+        ]
+        self.comment = Comment.objects.create(
+            post=self.posts[0], author=self.follower, text='Комментарий'
+        )
+
+    def act(self, model, action, objects, **data):
+        return self.client.post(
+            reverse(f'admin:posts_{model}_changelist'),
+            dict(
+                data, action=action,
+                _selected_action=[obj.pk for obj in objects],
+            ),
+            follow=True,
+        )
+
+    def assertCount(self, obj, field, value):
+        obj.refresh_from_db()
+        self.assertEqual(getattr(obj, field), value)
+
+    def test_move_to_group(self):
+        """Посты переносятся одним UPDATE, счётчики групп сходятся."""
+        response = self.act(
+            'post', 'move_to_group', self.posts[:2], group=self.other.slug
+        )
+        self.assertContains(response, 'Перенесено постов: 2.')
+        self.assertEqual(Post.objects.filter(group=self.other).count(), 2)
+        self.assertCount(self.group, 'posts_count', 1)
+        self.assertCount(self.other, 'posts_count', 2)
+        self.act('post', 'move_to_group', self.posts, group='')
+        self.assertEqual(Post.objects.filter(group=None).count(), 3)
+        self.assertCount(self.other, 'posts_count', 0)
+
+    def test_delete_posts(self):
+        """Удаление постов убирает комментарии и записи лент."""
+        response = self.act('post', 'delete_posts', self.posts[:2])
+        self.assertContains(response, 'Удалено постов: 2.')
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+        self.assertCount(self.author.stats, 'posts_count', 1)
+        self.assertCount(self.group, 'posts_count', 1)
+
+    def test_delete_comments(self):
+        """Удаление комментариев уменьшает их счётчик у поста."""
+        response = self.act('comment', 'delete_comments', [self.comment])
+        self.assertContains(response, 'Удалено комментариев: 1.')
+        self.assertFalse(Comment.objects.exists())
+        self.assertCount(self.posts[0], 'comments_count', 0)
+
+    @override_settings(BULK_INLINE_LIMIT=2)
+    def test_large_selection_is_queued(self):
+        """Большая выборка уходит в очередь задачами по лимиту."""
+        response = self.act('post', 'delete_posts', self.posts)
+        self.assertContains(response, 'поставлено в очередь задачами (2)')
+        self.assertEqual(Post.objects.count(), 3)
+        claimed = jobs.claim(10)
+        # в процессе из пула действие в БД не пишет
+        errors = [jobs.execute(job) for job in claimed]
+        self.assertEqual(Post.objects.count(), 3)
+        for job, error in zip(claimed, errors):
+            jobs.complete(job, error)
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(
+            Job.objects.filter(kind=bulk.DELETE_POSTS).count(), 2
+        )
+        self.assertCount(self.author.stats, 'posts_count', 0)
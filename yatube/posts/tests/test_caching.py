@@ -0,0 +1,226 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import caching
+from ..models import Follow, Group, Post, User
+
+
+class CacheInvalidationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Первый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_follow_keeps_unrelated_cache(self):
+        """Подписка не стирает чужие записи кэша."""
+        cache.set('unrelated', 'value')
+        index_generation = caching.generation(caching.INDEX)
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertEqual(cache.get('unrelated'), 'value')
+        self.assertEqual(
+            caching.generation(caching.INDEX), index_generation
+        )
+
+    def test_follow_invalidates_author_profile(self):
+        """Подписка сбрасывает страницу автора и ленту подписчика."""
+        profile = caching.generation(caching.profile_namespace(self.author.id))
+        feed = caching.generation(caching.feed_namespace(self.user.id))
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertNotEqual(
+            caching.generation(caching.profile_namespace(self.author.id)),
+            profile,
+        )
+        self.assertNotEqual(
+            caching.generation(caching.feed_namespace(self.user.id)), feed
+        )
+
+    def test_new_post_invalidates_index_and_feeds(self):
+        """Новый пост сбрасывает главную и ленты подписчиков."""
+        Follow.objects.create(user=self.user, author=self.author)
+        feed = caching.feed_namespace(self.user.id)
+        generations = {
+            namespace: caching.generation(namespace)
+            for namespace in (caching.INDEX, feed)
+        }
+        self.author_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'}
+        )
+        for namespace, value in generations.items():
+            with self.subTest(namespace=namespace):
+                self.assertNotEqual(caching.generation(namespace), value)
+
+    def test_index_refreshes_after_post_create(self):
+        """Главная показывает новый пост сразу после публикации."""
+        self.authorized_client.get(reverse('posts:index'))
+        self.author_client.post(
+            reverse('posts:post_create'), {'text': 'Свежий пост'}
+        )
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Свежий пост')
+
+    def test_post_signals_bump_generations(self):
+        """Изменение и удаление поста меняют поколения его списков."""
+        old_group = Group.objects.create(title='Старая', slug='old')
+        new_group = Group.objects.create(title='Новая', slug='new')
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=old_group
+        )
+        namespaces = (
+            caching.INDEX,
+            caching.profile_namespace(self.author.id),
+            caching.group_namespace(old_group.id),
+            caching.group_namespace(new_group.id),
+        )
+        before = caching.generations(*namespaces)
+        post = Post.objects.get(id=post.id)
+        post.group = new_group
+        post.save()
+        after_edit = caching.generations(*namespaces)
+        for namespace, old, new in zip(namespaces, before, after_edit):
+            with self.subTest(namespace=namespace):
+                self.assertNotEqual(old, new)
+        post.delete()
+        self.assertNotEqual(
+            caching.generation(caching.INDEX), after_edit[0]
+        )
+
+    def test_group_page_refreshes_after_post_delete(self):
+        """Страница группы не показывает удалённый пост."""
+        group = Group.objects.create(title='Группа', slug='group')
+        post = Post.objects.create(
+            text='Пост для удаления', author=self.author, group=group
+        )
+        url = reverse('posts:group_list', kwargs={'slug': group.slug})
+        self.assertContains(self.authorized_client.get(url), post.text)
+        post.delete()
+        self.assertNotContains(self.authorized_client.get(url), post.text)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_are_cached(self):
+        """Карточка рендерится один раз и потом берётся из кэша."""
+        [(_, card)] = caching.post_cards([self.post])
+        self.assertIn('Лев Толстой', card)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                caching.post_cards([self.post]), [(self.post, card)]
+            )
+
+    def test_post_edit_changes_card(self):
+        """Правка поста даёт новую карточку."""
+        caching.post_cards([self.post])
+        post = Post.objects.get(id=self.post.id)
+        post.text = 'Исправленный пост'
+        post.save()
+        [(_, card)] = caching.post_cards([post])
+        self.assertIn('Исправленный пост', card)
+
+    def test_author_rename_invalidates_cards(self):
+        """Смена имени автора сбрасывает карточки его постов."""
+        caching.post_cards([self.post])
+        author = User.objects.get(id=self.author.id)
+        author.first_name = 'Алексей'
+        author.save()
+        post = Post.objects.get(id=self.post.id)
+        [(_, card)] = caching.post_cards([post])
+        self.assertIn('Алексей Толстой', card)
+
+    def test_author_rename_refreshes_cached_pages(self):
+        """После смены имени кэшированные списки показывают новое имя."""
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(text='В группе', author=self.author, group=group)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+        for url in urls:
+            self.assertContains(self.client.get(url), 'Лев Толстой')
+        author = User.objects.get(id=self.author.id)
+        author.first_name = 'Алексей'
+        author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Алексей Толстой')
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return HttpResponse(f'Страница {self.calls}')
+
+    def test_hit_and_miss(self):
+        """Первая выдача считается, повторная берётся из кэша."""
+        first = caching._serve('page:test', 60, self.compute)
+        second = caching._serve('page:test', 60, self.compute)
+        self.assertEqual(first['X-Cache'], 'miss')
+        self.assertEqual(second['X-Cache'], 'hit')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(self.calls, 1)
+        stats = caching.page_cache_stats()
+        self.assertEqual((stats['hit'], stats['miss']), (1, 1))
+
+    def test_stale_while_refreshing(self):
+        """Пока один запрос пересчитывает страницу, остальным — старая."""
+        caching._serve('page:test', 60, self.compute)
+        entry = cache.get('page:test')
+        entry['expires'] = time.time() - 1
+        cache.set('page:test', entry)
+        cache.add('page:test:lock', 1)
+        response = caching._serve('page:test', 60, self.compute)
+        self.assertEqual(response['X-Cache'], 'stale')
+        self.assertEqual(self.calls, 1)
+        cache.delete('page:test:lock')
+        response = caching._serve('page:test', 60, self.compute)
+        self.assertEqual(response['X-Cache'], 'refresh')
+        self.assertEqual(response.content.decode(), 'Страница 2')
+
+    @override_settings(PAGE_CACHE_WAIT=0.1)
+    def test_single_flight_on_miss(self):
+        """Без копии в кэше чужая блокировка заставляет подождать."""
+        cache.add('page:test:lock', 1)
+        with mock.patch('posts.caching.time.sleep') as sleep:
+            sleep.side_effect = lambda _: cache.set(
+                'page:test', {
+                    'content': 'готово'.encode(), 'status': 200, 'headers': [],
+                    'expires': time.time() + 60, 'delta': 0,
+                }
+            )
+            response = caching._serve('page:test', 60, self.compute)
+        self.assertEqual(response.content, 'готово'.encode())
+        self.assertEqual(self.calls, 0)
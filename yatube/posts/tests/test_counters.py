@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    def assertCounters(self, obj, **expected):
+        obj.refresh_from_db()
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(obj, field), value)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счётчики."""
+        other = Group.objects.create(title='Другая', slug='other')
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        self.assertCounters(self.author.stats, posts_count=1)
+        self.assertCounters(self.group, posts_count=1)
+        post = Post.objects.get(id=post.id)
+        post.group = other
+        post.save()
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(other, posts_count=1)
+        post.delete()
+        self.assertCounters(self.author.stats, posts_count=0)
+        self.assertCounters(other, posts_count=0)
+
+    def test_comment_and_follow_counters(self):
+        """Комментарии и подписки ведут свои счётчики."""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий'
+        )
+        self.assertCounters(post, comments_count=1)
+        comment.delete()
+        self.assertCounters(post, comments_count=0)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertCounters(self.user.stats, following_count=1)
+        self.assertCounters(self.author.stats, followers_count=1)
+        follow.delete()
+        self.assertCounters(self.author.stats, followers_count=0)
+
+    def test_deferred_group(self):
+        """Пост без загруженной группы переносится с верными счётчиками."""
+        other = Group.objects.create(title='Другая', slug='other')
+        post = Post.objects.create(
+            text='Пост', author=self.author, group=self.group
+        )
+        post = Post.objects.only('id', 'text').get(id=post.id)
+        post.group = other
+        post.save()
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(other, posts_count=1)
+        post = Post.objects.only('id', 'text').get(id=post.id)
+        post.text = 'Правка'
+        post.save()
+        self.assertCounters(other, posts_count=1)
+
+    def test_delete_author(self):
+        """Автора с постами и комментариями можно удалить."""
+        author = User.objects.create_user(username='leaving')
+        post = Post.objects.create(
+            text='Пост', author=author, group=self.group
+        )
+        Comment.objects.create(post=post, author=author, text='Свой')
+        Comment.objects.create(post=post, author=self.user, text='Чужой')
+        other_post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=other_post, author=author, text='Ответ')
+        author.delete()
+        self.assertFalse(UserStats.objects.filter(user_id=author.id).exists())
+        self.assertFalse(Post.objects.filter(id=post.id).exists())
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(other_post, comments_count=0)
+
+    def test_repair_counters(self):
+        """Команда восстанавливает разъехавшиеся счётчики."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=self.author, group=self.group)
+            for i in range(3)
+        )
+        UserStats.objects.filter(user=self.author).delete()
+        out = StringIO()
+        call_command('repair_counters', batch_size=1, stdout=out)
+        self.assertIn('post: пересчитано строк 3', out.getvalue())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 3
+        )
+        self.assertCounters(self.group, posts_count=3)
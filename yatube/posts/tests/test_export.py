@@ -0,0 +1,130 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ExportDataTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def export(self, model, output, *args):
+        out = StringIO()
+        call_command(
+            'export_data', model, '-o', output, '--batch-size', '2', *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def read_jsonl(self, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_export_posts_jsonl(self):
+        """Посты выгружаются целиком, пачками по id."""
+        output = self.path('posts.jsonl.gz')
+        report = self.export('posts', output)
+        self.assertIn('выгружено 5', report)
+        rows = self.read_jsonl(output)
+        self.assertEqual(
+            [row['id'] for row in rows], [post.id for post in self.posts]
+        )
+        self.assertEqual(rows[0]['author'], 'author')
+        self.assertEqual(rows[0]['group'], 'group')
+        self.assertEqual(
+            rows[0]['pub_date'], self.posts[0].pub_date.isoformat()
+        )
+
+    def test_export_csv(self):
+        """CSV с заголовком: подписки и комментарии."""
+        output = self.path('follows.csv.gz')
+        self.export('follows', output, '--format', 'csv')
+        with gzip.open(output, 'rt', encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(rows[0]['user'], 'reader')
+        self.assertEqual(rows[0]['author'], 'author')
+        output = self.path('comments.csv.gz')
+        self.export('comments', output, '--format', 'csv')
+        with gzip.open(output, 'rt', encoding='utf-8') as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(rows[0]['post'], str(self.posts[0].id))
+
+    def test_incremental_export(self):
+        """С --state следующая выгрузка содержит только новые строки."""
+        state = self.path('state.json')
+        self.export('posts', self.path('first.jsonl.gz'), '--state', state)
+        new = Post.objects.create(text='Новый пост', author=self.author)
+        output = self.path('second.jsonl.gz')
+        self.export('posts', output, '--state', state)
+        self.assertEqual(
+            [row['id'] for row in self.read_jsonl(output)], [new.id]
+        )
+        with open(state, encoding='utf-8') as file:
+            self.assertEqual(json.load(file), {'posts': new.id})
+        output = self.path('since.jsonl.gz')
+        self.export('posts', output, '--since-id', str(self.posts[3].id))
+        self.assertEqual(len(self.read_jsonl(output)), 2)
+
+    def test_since_date(self):
+        """--since принимает и дату без времени: с её полуночи."""
+        old = [post.id for post in self.posts[:2]]
+        Post.objects.filter(id__in=old).update(
+            pub_date=timezone.make_aware(datetime(2020, 12, 31, 23, 59))
+        )
+        Post.objects.filter(id=self.posts[2].id).update(
+            pub_date=timezone.make_aware(datetime(2021, 1, 1, 0, 1))
+        )
+        output = self.path('since.jsonl.gz')
+        self.export('posts', output, '--since', '2021-01-01')
+        self.assertEqual(
+            [row['id'] for row in self.read_jsonl(output)],
+            [post.id for post in self.posts[2:]],
+        )
+        with self.assertRaises(CommandError):
+            self.export('posts', output, '--since', 'вчера')
+
+    def test_failed_export_leaves_nothing(self):
+        """Неверная пачка и сбой записи не оставляют .part и отметку."""
+        output = self.path('posts.jsonl.gz')
+        state = self.path('state.json')
+        with self.assertRaises(CommandError):
+            call_command(
+                'export_data', 'posts', '-o', output, '--batch-size', '0'
+            )
+        with mock.patch(
+            'posts.management.commands.export_data.rows',
+            side_effect=OSError('диск заполнен'),
+        ), self.assertRaises(OSError):
+            self.export('posts', output, '--state', state)
+        self.assertEqual(os.listdir(self.directory.name), [])
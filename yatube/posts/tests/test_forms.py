@@ -1,12 +1,16 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from PIL import Image
 
+from ..forms import PostForm
 from ..models import Post, User, Group, Comment
+from ..storage import is_content_addressed
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -69,7 +73,8 @@ class PostCreateFormTests(TestCase):
         last_post = Post.objects.latest('text', 'group', 'image')
         self.assertEqual(last_post.text, form_data['text'])
         self.assertEqual(last_post.group.id, form_data['group'])
-        self.assertEqual(last_post.image, 'posts/test.gif')
+        self.assertTrue(is_content_addressed(last_post.image.name))
+        self.assertTrue(last_post.image.name.endswith('.jpg'))
 
     def test_edit_post(self):
         """Валидная форма изменяет пост"""
@@ -111,3 +116,78 @@ class PostCreateFormTests(TestCase):
         comment_for_post = Comment.objects.get(id=post.id)
         self.assertEqual(comment_for_post.text,
                          form_data['text'])
+
+
+class ImageNormalizationTests(TestCase):
+    def upload(self, size, image_format='JPEG', **save_options):
+        output = BytesIO()
+        Image.new('RGB', size, (200, 0, 0)).save(
+            output, image_format, **save_options
+        )
+        return SimpleUploadedFile(
+            f'photo.{image_format.lower()}', output.getvalue(),
+            Image.MIME[image_format]
+        )
+
+    def clean(self, upload):
+        form = PostForm(data={'text': 'Текст'}, files={'image': upload})
+        form.is_valid()
+        return form
+
+    @override_settings(POST_IMAGE_MAX_SIZE=100)
+    def test_large_image_downscaled_without_exif(self):
+        """Большая картинка уменьшается и теряет EXIF."""
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera'
+        form = self.clean(self.upload((400, 200), exif=exif.tobytes()))
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertNotIn('exif', image.info)
+
+    def test_transparent_image_kept_as_png(self):
+        """Картинка с прозрачностью пересохраняется в PNG."""
+        output = BytesIO()
+        Image.new('RGBA', (10, 10)).save(output, 'PNG')
+        form = self.clean(
+            SimpleUploadedFile('logo.png', output.getvalue(), 'image/png')
+        )
+        self.assertEqual(form.cleaned_data['image'].name, 'logo.png')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с огромным числом пикселей отклоняется."""
+        form = self.clean(self.upload((20, 20)))
+        self.assertIn('image', form.errors)
+
+    def test_truncated_image_rejected(self):
+        """Обрезанный JPEG — ошибка формы, а не исключение."""
+        output = BytesIO()
+        Image.effect_noise((200, 200), 64).convert('RGB').save(
+            output, 'JPEG'
+        )
+        data = output.getvalue()
+        form = self.clean(SimpleUploadedFile(
+            'broken.jpg', data[:len(data) // 2], 'image/jpeg'
+        ))
+        self.assertIn('image', form.errors)
+
+    @override_settings(
+        POST_IMAGE_MAX_SIZE=10, POST_IMAGE_MAX_DECODED_PIXELS=100
+    )
+    def test_decoded_size_is_bounded(self):
+        """JPEG декодируется уменьшенным, остальное — только до предела."""
+        form = self.clean(self.upload((80, 80)))
+        self.assertNotIn('image', form.errors)
+        form = self.clean(self.upload((80, 80), 'PNG'))
+        self.assertIn('image', form.errors)
+
+    @override_settings(
+        POST_IMAGE_MAX_SIZE=40, POST_IMAGE_MAX_DECODED_PIXELS=1600
+    )
+    def test_wide_jpeg_decoded_reduced(self):
+        """Вытянутый JPEG тоже декодируется уменьшенным."""
+        form = self.clean(self.upload((160, 40)))
+        self.assertNotIn('image', form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (40, 10))
@@ -0,0 +1,146 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+
+class ImportDataTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def jsonl(self, name, records):
+        return self.write(name, ''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in records
+        ))
+
+    def run_import(self, model, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_data', model, path, *args, stdout=out, stderr=err
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_import_all_models(self):
+        """Импорт пользователей, групп, постов и комментариев по ключам."""
+        reader = User.objects.create_user(username='reader')
+        users = self.write(
+            'users.csv',
+            'username,first_name,date_joined\n'
+            'leo,Лев,2020-01-01T10:00:00\nanna,Анна,\n',
+        )
+        self.run_import('users', users)
+        Follow.objects.create(user=reader, author=User.objects.get(
+            username='leo'
+        ))
+        self.run_import('groups', self.jsonl('groups.jsonl', [
+            {'slug': 'books', 'title': 'Книги'},
+        ]))
+        posts = self.jsonl('posts.jsonl.gz', [
+            {'id': 100, 'author': 'leo', 'group': 'books',
+             'text': 'Старый пост', 'pub_date': '2015-05-01T12:00:00Z'},
+            {'id': 101, 'author': 'anna', 'text': 'Без группы'},
+            {'id': 102, 'author': 'nobody', 'text': 'Чужой'},
+        ])
+        out, err = self.run_import('posts', posts, '--batch-size', '2')
+        self.assertIn('создано 2, пропущено 1', out)
+        self.assertIn('нет автора nobody', err)
+        post = Post.objects.get(id=100)
+        self.assertEqual(
+            post.pub_date, datetime(2015, 5, 1, 12, tzinfo=timezone.utc)
+        )
+        self.assertEqual(post.group.slug, 'books')
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertEqual(post.group.posts_count, 1)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=post).exists()
+        )
+        self.run_import('comments', self.jsonl('comments.jsonl', [
+            {'id': 1, 'post': 100, 'author': 'anna', 'text': 'Комментарий',
+             'created': '2016-01-01T00:00:00'},
+        ]))
+        comment = Comment.objects.get()
+        self.assertEqual(comment.created.year, 2016)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_rerun_skips_existing(self):
+        """Повторный импорт того же файла ничего не дублирует."""
+        User.objects.create_user(username='leo')
+        Group.objects.create(title='Книги', slug='books')
+        posts = self.jsonl('posts.jsonl', [
+            {'id': 7, 'author': 'leo', 'text': 'Пост'},
+        ])
+        self.run_import('posts', posts)
+        out, _ = self.run_import('posts', posts)
+        self.assertIn('создано 0, пропущено 1', out)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(
+            User.objects.get(username='leo').stats.posts_count, 1
+        )
+        new = Post.objects.create(
+            text='Новый', author=User.objects.get(username='leo')
+        )
+        self.assertGreater(new.id, 7)
+
+    def test_rerun_restores_timelines(self):
+        """Перезапуск дополняет ленты постами, импортированными раньше."""
+        leo = User.objects.create_user(username='leo')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=leo)
+        posts = self.jsonl('posts.jsonl', [
+            {'id': 7, 'author': 'leo', 'text': 'Пост'},
+        ])
+        self.run_import('posts', posts)
+        # прошлый запуск оборвался до раскладки по лентам
+        TimelineEntry.objects.all().delete()
+        self.run_import('posts', posts)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post_id=7).exists()
+        )
+
+    def test_malformed_records_skipped(self):
+        """Не-JSON, не-объекты, записи без id и поля не того типа
+        пропускаются, а не обрывают импорт.
+        """
+        User.objects.create_user(username='leo')
+        path = self.write('posts.jsonl', '\n'.join([
+            '[1, 2]',
+            '"текст"',
+            '{не JSON',
+            json.dumps({'id': [1], 'author': 'leo', 'text': 'Пост'}),
+            json.dumps({'author': 'leo', 'text': 'Без id'}),
+            json.dumps({'id': 5, 'author': 'leo', 'text': 'Пост'}),
+        ]))
+        out, err = self.run_import('posts', path)
+        self.assertIn('создано 1, пропущено 5', out)
+        self.assertIn('Строка 1: пропущена (не объект)', err)
+        self.assertIn('Строка 3: пропущена (не JSON', err)
+        self.assertIn('TypeError', err)
+        self.assertIn('нет id', err)
+        self.assertEqual(Post.objects.get().id, 5)
+        out, _ = self.run_import('posts', path)
+        self.assertIn('создано 0, пропущено 6', out)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_batch_size_must_be_positive(self):
+        """Пачка из нуля записей — ошибка, а не пустой импорт."""
+        path = self.jsonl('groups.jsonl', [{'slug': 'books', 'title': 'К'}])
+        with self.assertRaises(CommandError):
+            self.run_import('groups', path, '--batch-size', '0')
+        self.assertFalse(Group.objects.exists())
@@ -1,6 +1,7 @@
+from django.db import IntegrityError
 from django.test import TestCase
 
-from ..models import Group, Post, User
+from ..models import Follow, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -64,3 +65,13 @@ class PostModelTest(TestCase):
             post._meta.get_field('group').help_text,
             'Группа, к которой будет относиться пост'
         )
+
+
+class FollowModelTest(TestCase):
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора не сохраняется."""
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=user, author=author)
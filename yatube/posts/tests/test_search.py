@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    def found(self, text, **kwargs):
+        return [post.text for post in search.search_page(text, **kwargs)]
+
+    def test_ranked_results(self):
+        """Находятся посты со всеми словами, более подходящие первыми."""
+        Post.objects.create(
+            text='Утро у моря, море спокойно', author=self.author
+        )
+        Post.objects.create(
+            text='Утро. Долгий рассказ про горы, лес, поле и море',
+            author=self.author,
+        )
+        Post.objects.create(text='Вечер в городе', author=self.author)
+        self.assertEqual(self.found('утро мор'), [
+            'Утро у моря, море спокойно',
+            'Утро. Долгий рассказ про горы, лес, поле и море',
+        ])
+        self.assertEqual(self.found('ёжик'), [])
+        self.assertEqual(self.found('  '), [])
+
+    def test_keyset_pagination(self):
+        """Курсор следующей страницы продолжает выдачу без повторов."""
+        Post.objects.bulk_create(
+            Post(text=f'Пост про кофе номер {i}', author=self.author)
+            for i in range(5)
+        )
+        first = search.search_page('кофе', per_page=3)
+        self.assertTrue(first.has_next())
+        second = search.search_page(
+            'кофе', after=first.next_cursor, per_page=3
+        )
+        self.assertFalse(second.has_next())
+        ids = [post.id for post in first] + [post.id for post in second]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_index_follows_changes(self):
+        """Триггеры обновляют индекс при правке и удалении поста."""
+        post = Post.objects.create(text='Старый текст', author=self.author)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(self.found('старый'), [])
+        self.assertEqual(self.found('новый'), ['Новый текст'])
+        post.delete()
+        self.assertEqual(self.found('новый'), [])
+
+    def test_rebuild_command(self):
+        """Команда перестраивает индекс по таблице постов."""
+        Post.objects.create(text='Кошка на окне', author=self.author)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {search.FTS_TABLE}({search.FTS_TABLE}) "
+                f"VALUES ('delete-all')"
+            )
+        self.assertEqual(self.found('кошка'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('кошка'), ['Кошка на окне'])
+
+    def test_search_view(self):
+        """Страница поиска показывает найденные посты."""
+        Post.objects.create(text='Рецепт пирога', author=self.author)
+        Post.objects.create(text='Футбол вечером', author=self.author)
+        response = self.client.get(reverse('posts:search'), {'q': 'пирог'})
+        self.assertContains(response, 'Рецепт пирога')
+        self.assertNotContains(response, 'Футбол вечером')
+        self.assertEqual(response.context['query'], 'пирог')
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .. import thumbnails
+from ..models import Job, Post, StoredImage, User
+from ..storage import content_name
+from .test_thumbnails import SMALL_GIF
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_KVSTORE_PATH=os.path.join(TEMP_MEDIA_ROOT, 'thumbnails.sqlite3'),
+)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.name = content_name(
+            'posts', hashlib.sha256(SMALL_GIF).hexdigest(), '.gif'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, filename='small.gif'):
+        return Post.objects.create(
+            text='Пост', author=self.user,
+            image=SimpleUploadedFile(filename, SMALL_GIF, 'image/gif'),
+        )
+
+    def test_same_content_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом со счётчиком ссылок."""
+        first = self.create_post('first.gif')
+        second = self.create_post('second.GIF')
+        self.assertEqual(first.image.name, self.name)
+        self.assertEqual(second.image.name, self.name)
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(self.name)]
+        )
+        self.assertEqual(
+            StoredImage.objects.get(name=self.name).references, 2
+        )
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_last_reference_deletes_file(self):
+        """Последний удалённый пост удаляет и файл."""
+        first = self.create_post()
+        second = self.create_post()
+        path = first.image.path
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredImage.objects.exists())
+
+    def test_release_during_upload(self):
+        """Файл, удалённый последним release во время загрузки той же
+        картинки, записывается заново.
+        """
+        first = self.create_post()
+        path = first.image.path
+        acquire = thumbnails.acquire
+
+        def release_first(name):
+            first.delete()
+            self.assertFalse(os.path.exists(path))
+            acquire(name)
+
+        with mock.patch('posts.thumbnails.acquire', release_first):
+            second = self.create_post()
+        self.assertEqual(second.image.name, self.name)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(
+            StoredImage.objects.get(name=self.name).references, 1
+        )
+
+    def test_same_file_uploaded_again(self):
+        """Повторная загрузка того же файла в пост не добавляет ссылку."""
+        post = self.create_post()
+        post.image = SimpleUploadedFile('again.gif', SMALL_GIF, 'image/gif')
+        post.save()
+        self.assertEqual(
+            StoredImage.objects.get(name=self.name).references, 1
+        )
+
+    def test_dedupe_media(self):
+        """Команда переносит старые файлы и склеивает одинаковые."""
+        legacy = FileSystemStorage()
+        names = [
+            legacy.save(f'posts/old{i}.gif', ContentFile(SMALL_GIF))
+            for i in range(2)
+        ]
+        for name in names:
+            Post.objects.create(text='Старый пост', author=self.user,
+                                image=name)
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('Перенесено файлов: 2, уникальных: 1', out.getvalue())
+        self.assertEqual(
+            set(Post.objects.values_list('image', flat=True)), {self.name}
+        )
+        for name in names:
+            with self.subTest(name=name):
+                self.assertFalse(legacy.exists(name))
+        self.assertEqual(
+            StoredImage.objects.get(name=self.name).references, 2
+        )
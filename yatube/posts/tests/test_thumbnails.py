@@ -0,0 +1,219 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .. import jobs, thumbnails
+from ..models import Job, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # у каждого теста своё хранилище миниатюр: его не откатывает
+        # транзакция теста
+        kvstore = self.settings(THUMBNAIL_KVSTORE_PATH=os.path.join(
+            TEMP_MEDIA_ROOT, f'{self._testMethodName}.sqlite3'
+        ))
+        kvstore.enable()
+        self.addCleanup(kvstore.disable)
+
+    def create_post(self):
+        return Post.objects.create(
+            text='Пост с картинкой', author=self.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def run_jobs(self):
+        out = StringIO()
+        call_command('run_jobs', processes=1, once=True, stdout=out)
+        return out.getvalue()
+
+    def test_thumbnails_queued_on_save(self):
+        """Миниатюры режет воркер очереди, а не запрос."""
+        post = self.create_post()
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertFalse(post.thumbnails_ready)
+        self.assertIn('В очереди: 0', self.run_jobs())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+        self.assertIsNotNone(default.kvstore.get(
+            ImageFile(post.image.name, default.storage)
+        ))
+        self.assertEqual(jobs.stats()['pending'], 0)
+        self.assertIsNotNone(jobs.stats()['run'])
+
+    def test_original_shown_until_ready(self):
+        """Пока задача в очереди, страница поста показывает оригинал."""
+        post = self.create_post()
+        url = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        self.assertContains(self.client.get(url), post.image.url)
+        self.run_jobs()
+        self.assertNotContains(self.client.get(url), post.image.url)
+
+    def test_picture_srcset(self):
+        """Готовая картинка выводится в <picture> со всеми ширинами."""
+        post = self.create_post()
+        self.run_jobs()
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, '<picture>')
+        for size in settings.POST_IMAGE_WIDTHS:
+            with self.subTest(size=size):
+                self.assertContains(response, f' {size}w')
+
+    def trace_kvstore(self):
+        statements = []
+        default.kvstore._connection().set_trace_callback(statements.append)
+        self.addCleanup(default.kvstore._connection().set_trace_callback, None)
+        return statements
+
+    def test_pictures_resolved_in_one_query(self):
+        """Миниатюры страницы ищутся одним запросом, потом — в процессе."""
+        for _ in range(3):
+            self.create_post()
+        self.run_jobs()
+        posts = list(Post.objects.all())
+        cache.clear()
+        default.kvstore._local.clear()
+        statements = self.trace_kvstore()
+        with self.assertNumQueries(0):
+            pictures = thumbnails.pictures(posts)
+        self.assertEqual(len(statements), 1)
+        statements.clear()
+        self.assertEqual(thumbnails.pictures(posts), pictures)
+        self.assertEqual(statements, [])
+        for post in posts:
+            with self.subTest(post=post.id):
+                self.assertNotEqual(pictures[post.id]['src'], post.image.url)
+
+    def test_kvstore_warmup(self):
+        """После warmup миниатюры берутся из памяти процесса."""
+        post = self.create_post()
+        self.run_jobs()
+        post.refresh_from_db()
+        default.kvstore._local.clear()
+        self.assertGreater(default.kvstore.warmup(), 0)
+        statements = self.trace_kvstore()
+        thumbnails.pictures([post])
+        self.assertEqual(statements, [])
+
+    def test_kvstore_local_cache_expires(self):
+        """Удаление в другом процессе видно, когда запись LRU устарела."""
+        self.create_post()
+        self.run_jobs()
+        key, _ = default.kvstore._connection().execute(
+            'SELECT key, value FROM kvstore LIMIT 1'
+        ).fetchone()
+        self.assertIsNotNone(default.kvstore._get_raw(key))
+        with sqlite3.connect(settings.THUMBNAIL_KVSTORE_PATH) as other:
+            other.execute('DELETE FROM kvstore WHERE key = ?', [key])
+        self.assertIsNotNone(default.kvstore._get_raw(key))
+        with mock.patch(
+            'posts.kvstore.time.monotonic',
+            return_value=time.monotonic()
+            + settings.THUMBNAIL_LOCAL_CACHE_TIMEOUT + 1,
+        ):
+            self.assertIsNone(default.kvstore._get_raw(key))
+
+    @override_settings(POST_IMAGE_FORMATS=['UNKNOWN', 'JPEG'])
+    def test_unsupported_formats_skipped(self):
+        """Форматы, которые Pillow не умеет сохранять, пропускаются."""
+        self.assertEqual(thumbnails.formats(), ['JPEG'])
+
+    def test_image_description_stored(self):
+        """Размеры и заглушка картинки сохраняются вместе с постом."""
+        post = Post.objects.get(id=self.create_post().id)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        with mock.patch('posts.thumbnails.describe') as describe:
+            duplicate = self.create_post()
+        describe.assert_not_called()
+        self.assertEqual(duplicate.image_placeholder, post.image_placeholder)
+
+    def test_picture_dimensions_and_placeholder(self):
+        """Разметка картинки несёт размеры и заглушку, но не читает файл."""
+        post = self.create_post()
+        url = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        response = self.client.get(url)
+        self.assertContains(response, 'width="2" height="1"')
+        self.assertContains(response, post.image_placeholder)
+        self.run_jobs()
+        with mock.patch('posts.thumbnails.describe') as describe:
+            response = self.client.get(url)
+        describe.assert_not_called()
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_failed_job_is_recorded(self):
+        """Ошибка обработчика не роняет воркер и сохраняется в задаче."""
+        self.create_post()
+        with mock.patch('posts.thumbnails.generate', side_effect=OSError):
+            self.assertIn('с ошибкой: 1', self.run_jobs())
+        self.assertIn('OSError', Job.objects.get().error)
+
+    def test_failed_done_is_recorded(self):
+        """Ошибка в done отмечает задачу как failed, а не running."""
+        self.create_post()
+        with mock.patch(
+            'posts.thumbnails.mark_ready', side_effect=RuntimeError
+        ):
+            self.assertIn('с ошибкой: 1', self.run_jobs())
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('RuntimeError', job.error)
+
+    def test_unchanged_image_is_skipped(self):
+        """Правка текста не ставит миниатюры в очередь заново."""
+        post = Post.objects.get(id=self.create_post().id)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_generate_thumbnails_command(self):
+        """Команда создаёт миниатюры для уже опубликованных постов."""
+        post = self.create_post()
+        out = StringIO()
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            call_command('generate_thumbnails', processes=1, stdout=out)
+        geometry, options = settings.POST_THUMBNAILS[0]
+        get_thumbnail.assert_any_call(post.image.name, geometry, **options)
+        self.assertIn('Обработано картинок: 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
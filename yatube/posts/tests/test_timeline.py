@@ -0,0 +1,157 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import jobs, timeline
+from ..models import Follow, Post, TimelineEntry, User, UserStats
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def follow(self):
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': self.author.username})
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту прежние посты автора."""
+        self.follow()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post
+        ).exists())
+
+    def test_new_post_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков."""
+        self.follow()
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        entry = TimelineEntry.objects.get(user=self.reader, post=post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+        self.assertEqual(entry.author, self.author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.author, post=post
+        ).exists())
+
+    def test_unfollow_clears_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        self.follow()
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': self.author.username})
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+
+    def test_rebuild_timeline_command(self):
+        """Команда rebuild_timeline восстанавливает ленту по подпискам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        call_command('rebuild_timeline', stdout=StringIO())
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(
+                user=self.reader
+            ).values_list('post_id', flat=True)),
+            [self.old_post.id]
+        )
+
+    @override_settings(FEED_FANOUT_THRESHOLD=0)
+    def test_celebrity_posts_merged_on_read(self):
+        """Посты популярного автора не раскладываются, но видны в ленте."""
+        self.follow()
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(
+            list(timeline.feed(self.reader).get_page(1)),
+            [post, self.old_post]
+        )
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_feed_pages_by_timeline_entries(self):
+        """Лента листается по записям ленты, посты грузятся по id."""
+        self.follow()
+        posts = [self.old_post] + [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(4)
+        ]
+        posts.reverse()
+        paginator = timeline.feed(self.reader, per_page=2)
+        with self.assertNumQueries(2):
+            first = paginator.get_cursor_page()
+        self.assertEqual(list(first), posts[:2])
+        second = paginator.get_cursor_page(after=first.next_cursor)
+        self.assertEqual(list(second), posts[2:4])
+        self.assertEqual(
+            list(paginator.get_cursor_page(before=second.previous_cursor)),
+            posts[:2]
+        )
+        self.assertEqual(list(paginator.get_page(3)), posts[4:])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=0)
+    def test_pushed_and_pulled_posts_are_merged(self):
+        """Посты из ленты и посты знаменитости сливаются без повторов."""
+        self.follow()
+        # пост разложен по ленте, пока автор ещё не был знаменитостью
+        TimelineEntry.objects.create(
+            user=self.reader, post=self.old_post, author=self.author,
+            pub_date=self.old_post.pub_date,
+        )
+        other = User.objects.create_user(username='other')
+        self.authorized_client.get(
+            reverse('posts:profile_follow',
+                    kwargs={'username': other.username})
+        )
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=author)
+            for i, author in enumerate([self.author, other, self.author])
+        ]
+        page = timeline.feed(self.reader, per_page=10).get_page(1)
+        self.assertEqual(list(page), posts[::-1] + [self.old_post])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=2)
+    def test_celebrities_by_followers_counter(self):
+        """Знаменитости выбираются по счётчику подписчиков."""
+        UserStats.objects.filter(user=self.author).update(followers_count=3)
+        with self.assertNumQueries(2):
+            self.assertEqual(timeline.celebrity_ids(), {self.author.id})
+
+    def test_former_celebrity_is_backfilled(self):
+        """Автор, выпавший из знаменитостей, раскладывается по лентам."""
+        with override_settings(FEED_FANOUT_THRESHOLD=0):
+            self.follow()
+            self.assertEqual(timeline.celebrity_ids(), {self.author.id})
+        self.assertFalse(TimelineEntry.objects.exists())
+        cache.delete(timeline.CELEBRITIES_CACHE_KEY)
+        self.assertEqual(timeline.celebrity_ids(), set())
+        # пока ленты не дополнены, посты читаются на лету
+        self.assertEqual(
+            timeline.pulled_authors(self.reader), [self.author.id]
+        )
+        for job in jobs.claim(10):
+            jobs.complete(job, jobs.execute(job))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post
+        ).exists())
+        self.assertEqual(timeline.pulled_authors(self.reader), [])
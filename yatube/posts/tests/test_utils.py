@@ -0,0 +1,67 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ..models import Post, User
+from ..utils import CountingPaginator
+
+
+class CountingPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user) for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_count_is_cached(self):
+        """Количество считается один раз и берётся из кэша."""
+        self.assertEqual(CountingPaginator(Post.objects.all(), 10).count, 3)
+        Post.objects.create(text='Новый пост', author=self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                CountingPaginator(Post.objects.all(), 10).count, 3
+            )
+
+    def test_stale_count_does_not_cut_page(self):
+        """Отставшее количество не обрезает страницу."""
+        self.assertEqual(CountingPaginator(Post.objects.all(), 10).count, 3)
+        Post.objects.create(text='Новый пост', author=self.user)
+        self.assertEqual(
+            len(CountingPaginator(Post.objects.all(), 10).page(1)), 4
+        )
+
+    def test_empty_condition(self):
+        """Заведомо пустая выборка считается без запроса и без ошибки."""
+        paginator = CountingPaginator(Post.objects.filter(id__in=[]), 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.count, 0)
+        self.assertEqual(len(paginator.get_page(1)), 0)
+
+    @override_settings(PAGINATOR_ESTIMATE_FROM=1000)
+    def test_estimated_count_for_large_table(self):
+        """Для большой таблицы целиком используется оценка из статистики."""
+        with mock.patch('posts.utils.estimate_count', return_value=5000):
+            self.assertEqual(
+                CountingPaginator(Post.objects.all(), 10).count, 5000
+            )
+            self.assertEqual(CountingPaginator(
+                Post.objects.filter(author=self.user), 10
+            ).count, 3)
+
+    def test_elided_page_range(self):
+        """Окно номеров страниц не растёт вместе с числом страниц."""
+        paginator = CountingPaginator(list(range(1000)), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, '…', 48, 49, 50, 51, 52, '…', 100]
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(1)),
+            [1, 2, 3, '…', 100]
+        )
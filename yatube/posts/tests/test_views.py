@@ -1,16 +1,22 @@
 from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django import forms
 
 
+import hashlib
+import os
 import shutil
 import tempfile
+from http import HTTPStatus
 
-from ..models import Post, Group, User
-from ..utils import POSTS_PER_PAGE
+from ..models import Comment, Follow, Post, Group, User
+from ..storage import content_name
+from ..utils import COMMENTS_PER_PAGE, MAX_OFFSET_PAGE, POSTS_PER_PAGE
 
 TEST_OF_POST: int = 13
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -60,8 +66,97 @@ class PaginatorViewsTest(TestCase):
                     response_for_two_page.context['page_obj']
                 ), (TEST_OF_POST - POSTS_PER_PAGE))
 
+    def test_cursor_pages(self):
+        """Курсоры ?after= и ?before= листают ленту без номеров страниц."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_page = self.authorized_client.get(url).context['page_obj']
+        next_page = self.authorized_client.get(
+            url, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            list(next_page),
+            list(Post.objects.order_by('-pub_date', '-id')[POSTS_PER_PAGE:])
+        )
+        self.assertFalse(next_page.has_next())
+        previous_page = self.authorized_client.get(
+            url, {'before': next_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+
+    def test_bad_cursor_and_deep_page(self):
+        """Битый курсор ведёт на первую страницу, далёкий номер — 404."""
+        url = reverse('posts:index')
+        response = self.authorized_client.get(url, {'after': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(
+                url, {'page': MAX_OFFSET_PAGE + 1}
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries
+        ))
+
+    def test_cursor_page_skips_count(self):
+        """Страница по курсору не считает количество постов."""
+        url = reverse('posts:index')
+        cursor = self.authorized_client.get(url).context[
+            'page_obj'
+        ].next_cursor
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url, {'after': cursor})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries.captured_queries
+        ))
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        )
+        cls.comments = list(Comment.objects.order_by('created', 'id'))
+
+    def test_detail_shows_first_comments(self):
+        """На странице поста только первая порция комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[:COMMENTS_PER_PAGE])
+        self.assertContains(response, f'?after={comments.next_cursor}')
+
+    def test_comments_endpoint(self):
+        """Следующая порция отдаётся фрагментом HTML или JSON."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        cursor = self.client.get(url).context['comments'].next_cursor
+        response = self.client.get(url, {'after': cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[COMMENTS_PER_PAGE:]
+        )
+        data = self.client.get(url, {'after': cursor, 'format': 'json'}).json()
+        self.assertEqual(
+            [comment['id'] for comment in data['comments']],
+            [comment.id for comment in self.comments[COMMENTS_PER_PAGE:]]
+        )
+        self.assertIsNone(data['next'])
+
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_KVSTORE_PATH=os.path.join(TEMP_MEDIA_ROOT, 'thumbnails.sqlite3'),
+)
 class PostsURLTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -90,6 +185,9 @@ class PostsURLTests(TestCase):
             content=cls.small_gif,
             content_type='image/gif'
         )
+        cls.image_name = content_name(
+            'posts', hashlib.sha256(cls.small_gif).hexdigest(), '.gif'
+        )
 
         cls.post = Post.objects.create(
             text='Тестовый текст',
@@ -240,7 +338,7 @@ class PostsURLTests(TestCase):
                 response = self.authorized_client.get(reverse_name)
                 first_object = response.context['page_obj'][0]
                 post_image_0 = first_object.image
-                self.assertEqual(post_image_0.name, 'posts/small.gif')
+                self.assertEqual(post_image_0.name, self.image_name)
 
         response = self.authorized_client.get(
             reverse('posts:post_detail',
@@ -248,27 +346,27 @@ class PostsURLTests(TestCase):
         )
         first_object = response.context['post']
         post_image_0 = first_object.image
-        self.assertEqual(post_image_0.name, 'posts/small.gif')
+        self.assertEqual(post_image_0.name, self.image_name)
 
     def test_cache_index(self):
-        """Проверка кэша индекса постов."""
-        response_cache_clear_posts_ok = self.authorized_client.get(
-            reverse('posts:index')
-        )
-        Post.objects.get(id=1).delete()
-        response_cache_ok_posts_delete = self.authorized_client.get(
+        """Главная кэшируется и сбрасывается при изменении постов."""
+        response_cached = self.authorized_client.get(reverse('posts:index'))
+        Post.objects.bulk_create([
+            Post(text='Пост в обход сигналов', author=self.user)
+        ])
+        response_still_cached = self.authorized_client.get(
             reverse('posts:index')
         )
         self.assertEqual(
-            response_cache_clear_posts_ok.content,
-            response_cache_ok_posts_delete.content)
-        cache.clear()
-        response_cache_clear_posts_delete = self.authorized_client.get(
+            response_cached.content,
+            response_still_cached.content)
+        Post.objects.get(id=1).delete()
+        response_after_delete = self.authorized_client.get(
             reverse('posts:index')
         )
         self.assertNotEqual(
-            response_cache_clear_posts_ok.content,
-            response_cache_clear_posts_delete
+            response_cached.content,
+            response_after_delete.content
         )
 
     def test_follow_authorized_client(self):
@@ -309,3 +407,73 @@ class PostsURLTests(TestCase):
             self.post_following_user,
             response_after_delete_follow.context['page_obj']
         )
+
+
+class QueryCountTests(TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_posts(self, count, start=0):
+        for i in range(start, count):
+            author = User.objects.create_user(username=f'author{i}')
+            Follow.objects.create(user=self.user, author=author)
+            Post.objects.create(
+                text=f'Пост {i}', author=author, group=self.group
+            )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url)
+        return len(queries)
+
+    def test_listings(self):
+        """Списки постов не догружают авторов и группы по одному."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:follow_index'),
+        )
+        self.create_posts(1)
+        one_post = [self.count_queries(url) for url in urls]
+        self.create_posts(POSTS_PER_PAGE, start=1)
+        full_page = [self.count_queries(url) for url in urls]
+        self.assertEqual(one_post, full_page)
+
+    def test_post_detail(self):
+        """Авторы комментариев загружаются вместе с постом."""
+        self.create_posts(1)
+        post = Post.objects.get()
+        url = reverse('posts:post_detail', kwargs={'post_id': post.id})
+        Comment.objects.create(post=post, author=self.user, text='Первый')
+        one_comment = self.count_queries(url)
+        for i in range(5):
+            author = User.objects.create_user(username=f'commentator{i}')
+            Comment.objects.create(post=post, author=author, text=f'{i}')
+        self.assertEqual(self.count_queries(url), one_comment)
+
+    def test_profile(self):
+        """Профиль: посты с группами и счётчики автора без догрузки."""
+        author = User.objects.create_user(username='author')
+        for i in range(POSTS_PER_PAGE):
+            Post.objects.create(
+                text=f'Пост {i}', author=author,
+                group=Group.objects.create(title=f'Г{i}', slug=f'g{i}'),
+            )
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        cache.clear()
+        # id автора для ключа кэша, сессия, пользователь, автор со
+        # счётчиками, количество постов, подписка и сама страница постов
+        with self.assertNumQueries(7):
+            response = self.authorized_client.get(url)
+        self.assertEqual(len(response.context['page_obj']), POSTS_PER_PAGE)
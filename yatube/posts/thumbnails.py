@@ -0,0 +1,253 @@
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from PIL import Image
+from sorl.thumbnail import default, delete, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import caching, jobs
+from .models import Post, StoredImage
+from .storage import is_content_addressed
+
+JOB_KIND = 'thumbnail'
+# пропорции кадра на странице поста и в ленте
+RATIO = (960, 339)
+
+
+def image_name(image):
+    """Имя файла картинки: из FieldFile, загруженного файла или строки."""
+    return getattr(image, 'name', image) or ''
+
+
+def formats():
+    """Форматы из POST_IMAGE_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format in Image.SAVE
+    ]
+
+
+def variants():
+    """Варианты для srcset: (формат, ширина, геометрия, параметры)."""
+    width, height = RATIO
+    return [
+        (
+            image_format, size, f'{size}x{round(size * height / width)}',
+            {'crop': 'center', 'upscale': True, 'format': image_format},
+        )
+        for image_format in formats()
+        for size in settings.POST_IMAGE_WIDTHS
+    ]
+
+
+def generate(name):
+    """Создаёт миниатюры из POST_THUMBNAILS и все варианты для srcset."""
+    for geometry, options in settings.POST_THUMBNAILS:
+        get_thumbnail(name, geometry, **options)
+    for _, _, geometry, options in variants():
+        get_thumbnail(name, geometry, **options)
+    return name
+
+
+def thumbnail_file(name, geometry, options):
+    """ImageFile миниатюры с тем же именем, что дал бы get_thumbnail."""
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage,
+    )
+
+
+def pictures(posts):
+    """Данные для <picture> всех постов: {id поста: картинка или None}.
+
+    Миниатюры всей страницы ищутся в хранилище sorl одним get_many и
+    ничего не режут; пока миниатюры поста не готовы, отдаётся оригинал.
+    """
+    geometry, options = settings.POST_THUMBNAILS[0]
+    specs = [(None, None, geometry, options)] + variants()
+    files = {}
+    for post in posts:
+        if post.image and post.thumbnails_ready:
+            for index, (_, _, geometry, options) in enumerate(specs):
+                files[post.id, index] = thumbnail_file(
+                    post.image.name, geometry, options
+                )
+    found = default.kvstore.get_many(files.values()) if files else {}
+    result = {}
+    for post in posts:
+        if not post.image:
+            result[post.id] = None
+            continue
+        thumbnails = [
+            found.get(files[post.id, index].key)
+            if (post.id, index) in files else None
+            for index in range(len(specs))
+        ]
+        sources = {}
+        for (image_format, size, _, _), thumbnail in zip(
+            specs[1:], thumbnails[1:]
+        ):
+            if thumbnail is not None:
+                sources.setdefault(image_format, []).append(
+                    f'{thumbnail.url} {size}w'
+                )
+        fallback = thumbnails[0]
+        if fallback is not None:
+            src, width, height = fallback.url, fallback.width, fallback.height
+        else:
+            src, width, height = (
+                post.image.url, post.image_width, post.image_height
+            )
+        result[post.id] = {
+            'src': src,
+            'width': width,
+            'height': height,
+            'placeholder': post.image_placeholder,
+            'sources': [
+                (Image.MIME[image_format], ', '.join(srcset))
+                for image_format, srcset in sources.items()
+            ],
+        }
+    return result
+
+
+def describe(name):
+    """Размеры картинки и крошечная заглушка в виде data: URI.
+
+    Возвращает None, если файл не удалось прочитать как картинку.
+    """
+    size = settings.POST_IMAGE_PLACEHOLDER_SIZE
+    try:
+        with default_storage.open(name) as content, \
+                Image.open(content) as image:
+            width, height = image.size
+            image.draft('RGB', (size, size))
+            image = image.convert('RGB')
+            image.thumbnail((size, size))
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=50)
+    except (OSError, SuspiciousFileOperation, Image.DecompressionBombError):
+        return None
+    encoded = base64.b64encode(output.getvalue()).decode()
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_placeholder': f'data:image/jpeg;base64,{encoded}',
+    }
+
+
+def store_description(post, name):
+    """Сохраняет размеры и заглушку картинки поста.
+
+    У одинаковых картинок они общие, поэтому файл открывается, только
+    если у других постов с этим файлом их ещё нет.
+    """
+    description = Post.objects.filter(image=name).exclude(
+        image_placeholder=''
+    ).values('image_width', 'image_height', 'image_placeholder').first()
+    if description is None:
+        description = describe(name) or {
+            'image_width': None,
+            'image_height': None,
+            'image_placeholder': '',
+        }
+    Post.objects.filter(id=post.id).update(**description)
+    for field, value in description.items():
+        setattr(post, field, value)
+
+
+def mark_ready(names):
+    """Отмечает готовые миниатюры и сбрасывает страницы с этими постами."""
+    posts = list(Post.objects.filter(image__in=names).only(
+        'id', 'author_id', 'group_id'
+    ))
+    Post.objects.filter(id__in=[post.id for post in posts]).update(
+        thumbnails_ready=True, updated=timezone.now()
+    )
+    for post in posts:
+        caching.invalidate_post(post)
+
+
+def schedule(post, name):
+    """Ставит миниатюры новой картинки в очередь вместо запроса.
+
+    Если та же картинка уже есть у другого поста, её готовые миниатюры
+    используются сразу.
+    """
+    ready = Post.objects.filter(
+        image=name, thumbnails_ready=True
+    ).exclude(id=post.id).exists()
+    if post.thumbnails_ready != ready:
+        Post.objects.filter(id=post.id).update(thumbnails_ready=ready)
+        post.thumbnails_ready = ready
+    if not ready:
+        jobs.enqueue(JOB_KIND, {'name': name}, unique=True)
+
+
+def acquire(name):
+    """Учитывает ещё один пост, ссылающийся на файл.
+
+    Строка StoredImage блокируется до конца внешней транзакции: пока
+    она не закончится, release не удалит файл, поэтому вызывающий
+    может проверить, что файл на месте, и при необходимости записать
+    его заново.
+    """
+    if is_content_addressed(name):
+        with transaction.atomic():
+            StoredImage.objects.get_or_create(name=name)
+            StoredImage.objects.select_for_update().filter(
+                name=name
+            ).update(references=F('references') + 1)
+
+
+def release(name, count=1):
+    """Снимает count ссылок на файл; последняя удаляет файл и миниатюры.
+
+    Файл удаляется под блокировкой строки StoredImage, поэтому
+    одновременная загрузка того же содержимого либо успевает взять
+    ссылку раньше, либо видит, что файла нет, и пишет его заново.
+    """
+    if not is_content_addressed(name):
+        return
+    with transaction.atomic():
+        # UPDATE блокирует строку и в SQLite, где select_for_update
+        # ничего не делает
+        StoredImage.objects.filter(name=name, references__gt=0).update(
+            references=Greatest(F('references') - count, 0)
+        )
+        image = StoredImage.objects.select_for_update().filter(
+            name=name
+        ).first()
+        if image is not None and image.references == 0:
+            image.delete()
+            delete(name)
+
+
+def _job_done(payload):
+    mark_ready([payload['name']])
+
+
+@jobs.register(JOB_KIND, done=_job_done)
+def _run_job(payload):
+    generate(payload['name'])
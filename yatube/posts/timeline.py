@@ -0,0 +1,164 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import counters, jobs
+from .models import Follow, Job, Post, TimelineEntry, User, UserStats
+from .utils import POSTS_PER_PAGE, MergedPaginator
+
+CELEBRITIES_CACHE_KEY = 'timeline:celebrities'
+# знаменитости по прошлому пересчёту: с ними сравнивается новый список
+KNOWN_CELEBRITIES_CACHE_KEY = 'timeline:celebrities:known'
+BACKFILL_JOB = 'timeline.backfill'
+
+
+def _celebrities():
+    """(знаменитости, бывшие знаменитости, чьи ленты ещё дополняются)."""
+    celebrities = cache.get(CELEBRITIES_CACHE_KEY)
+    if celebrities is None:
+        ids = frozenset(UserStats.objects.filter(
+            followers_count__gt=settings.FEED_FANOUT_THRESHOLD
+        ).values_list('user_id', flat=True))
+        known = cache.get(KNOWN_CELEBRITIES_CACHE_KEY)
+        if known is not None:
+            for author_id in known - ids:
+                jobs.enqueue(BACKFILL_JOB, {'author_id': author_id},
+                             unique=True)
+        cache.set(KNOWN_CELEBRITIES_CACHE_KEY, ids, None)
+        backfilling = frozenset(
+            json.loads(payload)['author_id']
+            for payload in Job.objects.filter(
+                kind=BACKFILL_JOB, status__in=(Job.PENDING, Job.RUNNING)
+            ).values_list('payload', flat=True)
+        )
+        celebrities = (ids, backfilling - ids)
+        cache.set(
+            CELEBRITIES_CACHE_KEY, celebrities,
+            settings.FEED_CELEBRITIES_TIMEOUT
+        )
+    return celebrities
+
+
+def celebrity_ids():
+    """Авторы, чьи посты не раскладываются по лентам, а читаются на лету."""
+    return _celebrities()[0]
+
+
+def pulled_authors(user):
+    """Авторы, чьи посты подмешиваются в ленту пользователя при чтении.
+
+    Это знаменитости, на которых он подписан, и бывшие знаменитости,
+    пока задача BACKFILL_JOB не разложила их посты по лентам.
+    """
+    celebrities, backfilling = _celebrities()
+    celebrities |= backfilling
+    if not celebrities:
+        return []
+    return list(Follow.objects.filter(
+        user=user, author_id__in=celebrities
+    ).values_list('author_id', flat=True))
+
+
+def feed(user, per_page=POSTS_PER_PAGE):
+    """Paginator ленты подписок.
+
+    Лента листается по записям TimelineEntry пользователя, а посты
+    знаменитостей — второй выборкой по индексу (author, -pub_date);
+    со страницы читается только её срез ключей, а сами посты —
+    одним запросом по id.
+    """
+    sources = [(
+        TimelineEntry.objects.filter(user=user),
+        ('-pub_date', '-post_id'),
+    )]
+    pulled = pulled_authors(user)
+    if pulled:
+        sources.append((
+            Post.objects.filter(author_id__in=pulled),
+            ('-pub_date', '-id'),
+        ))
+    return MergedPaginator(
+        sources, Post.objects.for_listing().in_bulk, per_page
+    )
+
+
+def _entries(user_ids, post):
+    return (
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in user_ids
+    )
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in celebrity_ids():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    with transaction.atomic():
+        _bulk_insert(_entries(followers.iterator(), post))
+
+
+def add_author(user, author):
+    """Добавляет в ленту пользователя последние посты автора."""
+    if author.id not in celebrity_ids():
+        _backfill([user.id], author.id)
+
+
+def _backfill(user_ids, author_id):
+    posts = list(Post.objects.filter(author_id=author_id).only(
+        'id', 'author_id', 'pub_date'
+    )[:settings.TIMELINE_BACKFILL_LIMIT])
+    with transaction.atomic():
+        _bulk_insert(
+            entry for post in posts for entry in _entries(user_ids, post)
+        )
+
+
+@jobs.register_done(BACKFILL_JOB)
+def _backfill_followers(payload):
+    """Раскладывает посты бывшей знаменитости по лентам подписчиков."""
+    author_id = payload['author_id']
+    if UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_THRESHOLD,
+    ).exists():
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for batch in counters.batches(followers.iterator(), 100):
+        _backfill(batch, author_id)
+    cache.delete(CELEBRITIES_CACHE_KEY)
+
+
+def remove_author(user, author):
+    """Убирает из ленты пользователя посты автора."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def rebuild(user):
+    """Пересобирает ленту пользователя по его подпискам."""
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user=user).delete()
+        for author in User.objects.filter(following__user=user):
+            add_author(user, author)
@@ -1,9 +1,328 @@
-from django.core.paginator import Paginator
+import hashlib
+import heapq
+import json
+from datetime import datetime
+from itertools import groupby
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+# дальше этой страницы по номеру не листаем: глубокие страницы
+# отдаются только по курсору, без OFFSET
+MAX_OFFSET_PAGE = 10
+CURSOR_SALT = 'posts.cursor'
+
+
+class CursorSerializer:
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+class PageTooDeep(InvalidPage):
+    """Номер страницы больше MAX_OFFSET_PAGE."""
+
+
+class CursorPage(Page):
+    """Страница, полученная по курсору: без номера и общего количества."""
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Page by cursor>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы по статистике планировщика или None."""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+    elif connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class CountingPaginator(Paginator):
+    """Paginator, который не считает COUNT(*) на каждый запрос.
+
+    Точное количество кэшируется на PAGINATOR_COUNT_TIMEOUT секунд —
+    это и есть предел его устаревания. Для запросов по всей большой
+    таблице вместо COUNT(*) берётся оценка из статистики БД.
+    """
+    ELLIPSIS = '…'
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return len(self.object_list)
+        try:
+            sql = str(query)
+        except EmptyResultSet:
+            # условие заведомо ложно, например id__in=[]: запроса не будет
+            return 0
+        key = 'paginator:count:' + hashlib.md5(sql.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self._estimated_count(query) or self.object_list.count()
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def page(self, number):
+        # количество из кэша может отставать, поэтому срез по нему не
+        # обрезаем: новые посты видны на последней странице сразу
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+    def _estimated_count(self, query):
+        # соединения select_related и ORDER BY количество не меняют
+        if (query.where or query.distinct or query.extra_tables
+                or query.combinator or query.group_by is not None):
+            return None
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < settings.PAGINATOR_ESTIMATE_FROM:
+            return None
+        return estimate
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей и по краям, пропуски — ELLIPSIS."""
+        page_range = self.page_range
+        if len(page_range) <= (on_each_side + on_ends) * 2:
+            yield from page_range
+            return
+        last = page_range[-1]
+        if number > on_each_side + on_ends + 2:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < last - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(last - on_ends + 1, last + 1)
+        else:
+            yield from range(number + 1, last + 1)
+
+
+class CursorPaginator(CountingPaginator):
+    """Paginator, который умеет листать по ключу (pub_date, id).
+
+    Первые MAX_OFFSET_PAGE страниц доступны по номеру, как раньше,
+    дальше — по непрозрачным курсорам ?after= и ?before=.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 **kwargs):
+        super().__init__(object_list.order_by(*ordering), per_page, **kwargs)
+        self.ordering = ordering
+
+    @property
+    def page_range(self):
+        return range(1, min(self.num_pages, MAX_OFFSET_PAGE) + 1)
+
+    def validate_number(self, number):
+        # проверяем до количества: глубокая страница не стоит COUNT(*)
+        try:
+            deep = int(number) > MAX_OFFSET_PAGE
+        except (TypeError, ValueError):
+            deep = False
+        if deep:
+            raise PageTooDeep(
+                f'Дальше страницы {MAX_OFFSET_PAGE} — только по курсору.'
+            )
+        return super().validate_number(number)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.next_cursor = self.cursor(page[-1]) if page.has_next() else None
+        page.page_range = list(self.get_elided_page_range(page.number))
+        return page
+
+    def cursor(self, obj):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            values.append(value)
+        return signing.dumps(
+            values, salt=CURSOR_SALT, serializer=CursorSerializer
+        )
+
+    def _keyset(self, values, reverse, ordering=None):
+        condition = None
+        for field, value in reversed(list(zip(ordering or self.ordering,
+                                              values))):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            strict = Q(**{f'{name}__{lookup}': value})
+            if condition is None:
+                condition = strict
+            else:
+                condition = strict | (Q(**{name: value}) & condition)
+        return condition
+
+    def get_cursor_page(self, after=None, before=None):
+        """Страница после курсора after или перед before.
+
+        Без курсоров — первая страница, но без подсчёта количества.
+        """
+        reverse = bool(before)
+        values = None
+        if after or before:
+            try:
+                values = signing.loads(
+                    before or after, salt=CURSOR_SALT,
+                    serializer=CursorSerializer
+                )
+            except signing.BadSignature:
+                return self.get_page(1)
+        items = self._window(self.per_page + 1, values, reverse)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if reverse:
+            items.reverse()
+        has_next = reverse or has_more
+        has_previous = has_more if reverse else bool(after)
+        return CursorPage(
+            items, self,
+            next_cursor=self.cursor(items[-1])
+            if items and has_next else None,
+            previous_cursor=self.cursor(items[0])
+            if items and has_previous else None,
+        )
+
+    def _window(self, limit, values=None, reverse=False):
+        """Первые limit объектов после ключа values (или с начала)."""
+        return list(self._ordered(
+            self.object_list, self.ordering, values, reverse
+        )[:limit])
+
+    def _ordered(self, queryset, ordering, values, reverse):
+        if values is not None:
+            queryset = queryset.filter(
+                self._keyset(values, reverse, ordering)
+            )
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            ]
+        return queryset.order_by(*ordering)
+
+
+class MergedPaginator(CursorPaginator):
+    """CursorPaginator по нескольким выборкам ключей (pub_date, id).
+
+    sources — пары (queryset, ordering), где ordering — те же два поля
+    в порядке ('-pub_date', '-id') под своими именами. Из каждой
+    выборки по индексу читается не больше строк, чем нужно странице,
+    ключи сливаются и повторы отбрасываются — как UNION двух
+    упорядоченных запросов с LIMIT. Объекты страницы загружаются
+    одним запросом по id функцией load(ids) -> {id: объект}.
+    """
+
+    def __init__(self, sources, load, per_page):
+        Paginator.__init__(self, sources, per_page)
+        self.ordering = ('-pub_date', '-id')
+        self.load = load
+
+    @cached_property
+    def count(self):
+        # повторы между выборками редки: количество и так приблизительное
+        return sum(
+            CountingPaginator(
+                queryset.order_by(*ordering), self.per_page
+            ).count
+            for queryset, ordering in self.object_list
+        )
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        keys = self._keys(bottom + self.per_page)[bottom:]
+        return self._get_page(self._objects(keys), number, self)
+
+    def _window(self, limit, values=None, reverse=False):
+        return self._objects(self._keys(limit, values, reverse))
+
+    def _keys(self, limit, values=None, reverse=False):
+        keys = []
+        for key, _ in groupby(heapq.merge(*(
+            self._ordered(
+                queryset.values_list(*(f.lstrip('-') for f in ordering)),
+                ordering, values, reverse,
+            )[:limit]
+            for queryset, ordering in self.object_list
+        ), reverse=not reverse)):
+            keys.append(key)
+            if len(keys) == limit:
+                break
+        return keys
+
+    def _objects(self, keys):
+        objects = self.load([post_id for _, post_id in keys])
+        return [objects[post_id] for _, post_id in keys if post_id in objects]
 
 
 def paginate_page(request, post_list):
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
+    return get_request_page(
+        request, CursorPaginator(post_list, POSTS_PER_PAGE)
+    )
+
+
+def get_request_page(request, paginator):
+    """Страница по курсору ?after=/?before= или по номеру ?page=."""
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        return paginator.get_cursor_page(after=after, before=before)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    try:
+        return paginator.get_page(page_number)
+    except PageTooDeep as error:
+        raise Http404(str(error))
+
+
+def paginate_comments(request, comment_list):
+    """Комментарии от старых к новым, порциями по курсору ?after=."""
+    paginator = CursorPaginator(
+        comment_list, COMMENTS_PER_PAGE, ordering=('created', 'id')
+    )
+    return paginator.get_cursor_page(after=request.GET.get('after'))
@@ -1,23 +1,51 @@
+from django.conf import settings
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
-from django.core.cache import cache
 
+from . import caching, search, timeline
 from .models import Group, Post, User, Follow
 from .forms import PostForm, CommentForm
-from .utils import paginate_page
+from .utils import get_request_page, paginate_comments, paginate_page
 
 
-@cache_page(20, key_prefix='index_page')
+def group_namespaces(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True
+    ).first()
+    return [caching.group_namespace(group_id)]
+
+
+def profile_namespaces(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True
+    ).first()
+    namespaces = [caching.profile_namespace(author_id)]
+    if request.user.is_authenticated:
+        namespaces.append(caching.feed_namespace(request.user.id))
+    return namespaces
+
+
+def feed_namespaces(request):
+    return [caching.feed_namespace(request.user.id)] + [
+        caching.profile_namespace(author_id)
+        for author_id in timeline.pulled_authors(request.user)
+    ]
+
+
+@caching.cache_listing(
+    settings.LISTING_CACHE_TIMEOUT, lambda request: [caching.INDEX]
+)
 def index(request):
-    page_obj = paginate_page(request, Post.objects.all())
+    page_obj = paginate_page(request, Post.objects.for_listing())
     context = dict(page_obj=page_obj)
     return render(request, 'posts/index.html', context)
 
 
+@caching.cache_listing(settings.LISTING_CACHE_TIMEOUT, group_namespaces)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    page_obj = paginate_page(request, group.posts.all())
+    page_obj = paginate_page(request, group.posts.for_listing())
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -25,9 +53,12 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@caching.cache_listing(settings.LISTING_CACHE_TIMEOUT, profile_namespaces)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = author.posts.for_listing()
     page_obj = paginate_page(request, post_list)
     following = (
         request.user.is_authenticated
@@ -46,18 +77,54 @@ def profile(request, username):
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.for_detail(), id=post_id)
     form = CommentForm(
         request.POST or None,
     )
     context = {
         'post': post,
-        'comments': post.comments.all(),
+        'comments': paginate_comments(
+            request, post.comments.select_related('author')
+        ),
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = paginate_comments(
+        request, post.comments.select_related('author')
+    )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.id,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next': comments.next_cursor,
+        })
+    context = {
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search.search_page(query, after=request.GET.get('after'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -110,13 +177,10 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
-@cache_page(20, key_prefix='follow_page')
 @login_required
+@caching.cache_listing(settings.LISTING_CACHE_TIMEOUT, feed_namespaces)
 def follow_index(request):
-    page_obj = paginate_page(
-        request, Post.objects.filter(
-            author__following__user=request.user)
-    )
+    page_obj = get_request_page(request, timeline.feed(request.user))
     context = {
         'page_obj': page_obj,
     }
@@ -125,23 +189,26 @@ def follow_index(request):
 
 @login_required()
 def profile_follow(request, username):
-    cache.clear()
     author = get_object_or_404(User, username=username)
 
     if author != request.user:
-        Follow.objects.get_or_create(
+        _, created = Follow.objects.get_or_create(
             user=request.user,
             author=author
         )
+        if created:
+            timeline.add_author(request.user, author)
+            caching.invalidate_follow(request.user, author)
     return redirect('posts:follow_index')
 
 
 @login_required()
 def profile_unfollow(request, username):
-    cache.clear()
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(
         user=request.user,
         author=author
     ).delete()
+    timeline.remove_author(request.user, author)
+    caching.invalidate_follow(request.user, author)
     return redirect('posts:follow_index')
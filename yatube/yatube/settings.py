@@ -132,3 +132,78 @@ CACHES = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# лента подписок: размер пачки при раскладке постов по лентам
+# и сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BATCH_SIZE = 1000
+TIMELINE_BACKFILL_LIMIT = 1000
+# посты авторов, у которых подписчиков больше порога, не раскладываются
+# по лентам, а подмешиваются при чтении; список знаменитостей живёт
+# FEED_CELEBRITIES_TIMEOUT секунд, и когда автор из него выпадает,
+# задача очереди (manage.py run_jobs) раскладывает его посты по лентам
+FEED_FANOUT_THRESHOLD = 1000
+FEED_CELEBRITIES_TIMEOUT = 60 * 5
+
+# сколько секунд паджинатор доверяет закэшированному количеству постов
+# и с какого размера таблицы вместо COUNT(*) берётся оценка из статистики БД
+PAGINATOR_COUNT_TIMEOUT = 60
+PAGINATOR_ESTIMATE_FROM = 100000
+
+# списки постов сбрасываются сигналами при изменении данных, поэтому
+# в общем кэше (Redis, Memcached) их можно держать долго. У LocMemCache
+# свой кэш в каждом процессе: сброс из одного воркера, run_jobs или
+# import_data до остальных не доходит, поэтому с ним — короткие сроки
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith('.LocMemCache')
+LISTING_CACHE_TIMEOUT = 60 * 60 * 6 if SHARED_CACHE else 20
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24 if SHARED_CACHE else 60 * 5
+
+# кэш страниц списков: сколько ещё отдавать устаревшую копию, пока её
+# пересчитывает один запрос, сколько держится блокировка пересчёта,
+# сколько ждать первую копию и насколько рано пересчитывать (XFetch)
+PAGE_CACHE_GRACE = 60
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_WAIT = 2
+PAGE_CACHE_BETA = 1.0
+
+# миниатюры картинок постов, которые создаются сразу при сохранении поста;
+# размеры и параметры должны совпадать с тегами {% thumbnail %} в шаблонах
+POST_THUMBNAILS = [
+    ('960x339', {'crop': 'center', 'upscale': True}),
+]
+# варианты картинки для <picture>/srcset: ширины с пропорциями 960x339 и
+# форматы в порядке предпочтения; форматы, которые не умеет сохранять
+# установленный Pillow (WEBP, AVIF), пропускаются
+POST_IMAGE_WIDTHS = [480, 960, 1440]
+POST_IMAGE_FORMATS = ['AVIF', 'WEBP', 'JPEG']
+# метаданные миниатюр лежат в отдельном файле SQLite, а не в кэше и БД;
+# найденные значения процесс держит у себя, не больше стольких ключей
+# и не дольше стольких секунд: удаления из других процессов доходят до
+# него с этой задержкой.
+# После смены хранилища известные миниатюры регистрирует заново
+# manage.py generate_thumbnails (готовые файлы не пересоздаются)
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_KVSTORE_PATH = os.path.join(BASE_DIR, 'thumbnails.sqlite3')
+THUMBNAIL_LOCAL_CACHE_SIZE = 10000
+THUMBNAIL_LOCAL_CACHE_TIMEOUT = 60
+
+# очередь фоновых задач (manage.py run_jobs): через сколько секунд задача
+# у молчащего воркера возвращается в очередь и как часто опрашивать очередь
+JOB_TIMEOUT = 60 * 10
+JOB_POLL_INTERVAL = 1
+
+# загружаемые картинки: предел длинной стороны после уменьшения, качество
+# пересохранения и предел числа пикселей исходника (защита от «бомб»);
+# JPEG декодируется уже уменьшенным, и декодированная картинка не больше
+# POST_IMAGE_MAX_DECODED_PIXELS (до 4 байт на пиксель)
+POST_IMAGE_MAX_SIZE = 2048
+POST_IMAGE_QUALITY = 85
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_DECODED_PIXELS = 16_000_000
+# длинная сторона размытой заглушки, которая показывается до загрузки
+POST_IMAGE_PLACEHOLDER_SIZE = 20
+
+# массовые действия в админке: сколько строк меняет один UPDATE/DELETE и
+# сколько строк обрабатывается прямо в запросе; выборка больше уходит
+# в очередь задачами по столько же id
+BULK_BATCH_SIZE = 1000
+BULK_INLINE_LIMIT = 5000
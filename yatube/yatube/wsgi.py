@@ -5,3 +5,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# загружаем метаданные миниатюр заранее, а не первыми запросами
+from sorl.thumbnail import default  # noqa: E402
+
+default.kvstore.warmup()